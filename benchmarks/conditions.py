@@ -0,0 +1,78 @@
+"""Compare compiled and interpreted trigger condition evaluation.
+
+Evaluates the condition of every registered trigger against each event in a
+recorded corpus of (anonymized) Slack events.
+
+Usage: python -m benchmarks.conditions [events.json] [--rounds N]
+"""
+
+import argparse
+import json
+import os
+import time
+
+from meowbot.context import CommandContext
+from meowbot.triggers import load_all_plugins
+from meowbot.triggers import trigger_registry
+
+DEFAULT_CORPUS = os.path.join(os.path.dirname(__file__), "events.json")
+
+
+def run(corpus, rounds, evaluate):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for data in corpus:
+            context = CommandContext(data)
+            for trigger_cls in trigger_registry:
+                evaluate(trigger_cls, context)
+    return time.perf_counter() - start
+
+
+def interpreted(trigger_cls, context):
+    return trigger_cls.condition.evaluate(context)
+
+
+def compiled(trigger_cls, context):
+    return trigger_cls._plan.evaluate(context)
+
+
+def baseline(trigger_cls, context):
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default=DEFAULT_CORPUS)
+    parser.add_argument("--rounds", type=int, default=2000)
+    args = parser.parse_args()
+
+    with open(args.corpus) as fp:
+        corpus = json.load(fp)
+    load_all_plugins()
+
+    # Both modes must agree before their timings mean anything
+    for data in corpus:
+        context = CommandContext(data)
+        for trigger_cls in trigger_registry:
+            if bool(interpreted(trigger_cls, context)) != bool(
+                compiled(trigger_cls, CommandContext(data))
+            ):
+                raise AssertionError(f"{trigger_cls.__name__} disagrees on {data}")
+
+    evaluations = args.rounds * len(corpus) * len(trigger_registry)
+    overhead = run(corpus, args.rounds, baseline)
+    results = {
+        "interpreted": run(corpus, args.rounds, interpreted) - overhead,
+        "compiled": run(corpus, args.rounds, compiled) - overhead,
+    }
+    print(
+        f"{len(corpus)} events x {len(trigger_registry)} triggers x "
+        f"{args.rounds} rounds"
+    )
+    for name, elapsed in results.items():
+        print(f"{name:>12}: {elapsed:.3f}s ({elapsed / evaluations * 1e9:.0f} ns/eval)")
+    print(f"{'speedup':>12}: {results['interpreted'] / results['compiled']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
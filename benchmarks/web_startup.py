@@ -0,0 +1,67 @@
+"""Check the web app's import time and memory against a budget.
+
+Imports the app in a fresh interpreter, the way each uwsgi process does, and
+fails if it takes too long, uses too much memory, or pulls in the trigger
+system or any plugin.
+
+Usage: python -m benchmarks.web_startup [--runs N]
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Generous enough for slow hosts, tight enough to catch plugins creeping back in
+IMPORT_SECONDS_BUDGET = 1.0
+MAX_RSS_MB_BUDGET = 70
+FORBIDDEN_MODULES = ("meowbot.triggers", "meowbot.worker", "meowbot.plugins")
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import meowbot
+elapsed = time.perf_counter() - start
+print(json.dumps({
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "modules": sorted(sys.modules),
+}))
+"""
+
+
+def probe():
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE], check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    results = [probe() for _ in range(args.runs)]
+    seconds = statistics.median(result["seconds"] for result in results)
+    max_rss_mb = max(result["max_rss_mb"] for result in results)
+    forbidden = sorted(
+        module
+        for module in results[0]["modules"]
+        if any(
+            module == name or module.startswith(f"{name}.")
+            for name in FORBIDDEN_MODULES
+        )
+    )
+
+    print(f"import time: {seconds:.3f}s (budget {IMPORT_SECONDS_BUDGET}s)")
+    print(f"max RSS:     {max_rss_mb:.1f} MB (budget {MAX_RSS_MB_BUDGET} MB)")
+    print(f"forbidden:   {', '.join(forbidden) or 'none'}")
+
+    if seconds > IMPORT_SECONDS_BUDGET or max_rss_mb > MAX_RSS_MB_BUDGET or forbidden:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,3 +6,19 @@ TEMPLATES_AUTO_RELOAD = True
 SQLALCHEMY_DATABASE_URI = "sqlite:///../instance/meowbot.db"
 SQLALCHEMY_TRACK_MODIFICATIONS = False
 REDIS_URL = "redis://redis:6379/0"
+# Jobs/resident memory after which `python -m meowbot.runner` restarts itself
+WORKER_MAX_JOBS = 1000
+WORKER_MAX_RSS_MB = 256
+# Threads per worker pool for running triggers and Slack posts concurrently.
+# 0 runs everything serially on the job's thread.
+WORKER_FANOUT_THREADS = 8
+# Longest a Slack API call may wait for a rate limit slot before failing
+SLACK_MAX_QUEUE_SECONDS = 60
+# Seconds each process uses a cached bot token before checking it is current
+BOT_ACCESS_TOKEN_TTL = 300
+# Local hours [start, end) in which saved locations' forecasts and air
+# quality are refreshed ahead of expiry, and the most fetches that may make
+# per day for each cache
+PREWARM_HOURS = (7, 23)
+PREWARM_TIMEZONE = "America/Los_Angeles"
+PREWARM_DAILY_FETCHES = {"weather": 400, "aqi": 100}
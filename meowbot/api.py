@@ -1,53 +1,162 @@
+import os
+import threading
+import time
+from collections import defaultdict
 from enum import Enum
+from functools import cache
+from functools import cached_property
 
 import requests
 from requests import Response
-
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+from instance.config import WORKER_FANOUT_THREADS
+from meowbot.ratelimit import backoff
+from meowbot.ratelimit import block
+from meowbot.ratelimit import bucket_key
+from meowbot.ratelimit import RateTier
+from meowbot.ratelimit import reserve
 from meowbot.util import get_bot_access_token
+from meowbot.util import invalidate_bot_access_token
+
+# (connect, read) timeouts in seconds for every Slack request
+SLACK_TIMEOUT = (3.05, 10)
+# Attempts per call when Slack answers 429 or no connection can be made
+SLACK_MAX_ATTEMPTS = 4
+# Errors meaning the bot token itself is no longer valid
+TOKEN_ERRORS = {"invalid_auth", "not_authed", "token_revoked", "account_inactive"}
 
 
 class SlackMethod(Enum):
     CHAT_POST_MESSAGE = (
         "https://slack.com/api/chat.postMessage",
-        requests.post,
+        "POST",
         ["channel"],
+        RateTier.PER_CHANNEL,
     )
     CHAT_POST_EPHEMERAL = (
         "https://slack.com/api/chat.postEphemeral",
-        requests.post,
+        "POST",
         ["channel", "user"],
+        RateTier.TIER_4,
     )
     CHAT_UPDATE = (
         "https://slack.com/api/chat.update",
-        requests.post,
+        "POST",
         ["channel", "ts"],
+        RateTier.TIER_3,
     )
     CHAT_DELETE = (
         "https://slack.com/api/chat.delete",
-        requests.post,
+        "POST",
         ["channel", "ts"],
+        RateTier.TIER_3,
+    )
+    IM_OPEN = (
+        "https://slack.com/api/im.open",
+        "POST",
+        ["user"],
+        RateTier.TIER_3,
     )
-    IM_OPEN = ("https://slack.com/api/im.open", requests.post, ["user"])
     REACTIONS_ADD = (
         "https://slack.com/api/reactions.add",
-        requests.post,
+        "POST",
         ["name", "channel", "timestamp"],
+        RateTier.TIER_3,
     )
 
-    def __init__(self, url: str, http_method, required_arguments: list[str]):
+    def __init__(
+        self,
+        url: str,
+        http_method: str,
+        required_arguments: list[str],
+        tier: RateTier,
+    ):
         self.url = url
         self.http_method = http_method
         self.required_arguments = required_arguments
+        self.tier = tier
+
+    def bucket_key(self, team_id: str | None, arguments: dict) -> str:
+        channel = arguments["channel"] if self.tier is RateTier.PER_CHANNEL else None
+        return bucket_key(self.name, team_id, channel)
+
+
+class RequestStats:
+    """Per-method call counts and latencies for this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = defaultdict(
+            lambda: {"calls": 0, "errors": 0, "total": 0.0, "max": 0.0}
+        )
+
+    def record(self, name: str, seconds: float, error: bool):
+        with self._lock:
+            stats = self._stats[name]
+            stats["calls"] += 1
+            stats["errors"] += error
+            stats["total"] += seconds
+            stats["max"] = max(stats["max"], seconds)
+
+    def snapshot(self) -> dict[str, dict]:
+        with self._lock:
+            return {name: dict(stats) for name, stats in self._stats.items()}
+
+
+request_stats = RequestStats()
+
+
+@cache
+def _get_session(pid):
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=max(WORKER_FANOUT_THREADS, 1) * 2,
+    )
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session():
+    # Keyed by pid so a forked worker opens its own connections instead of
+    # sharing its parent's sockets
+    return _get_session(os.getpid())
+
+
+def _never_sent(error: requests.ConnectionError) -> bool:
+    """Whether `error` happened before any connection to Slack was made"""
+    if isinstance(error, requests.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+def _send(name: str, http_method: str, url: str, **kwargs) -> Response:
+    start = time.perf_counter()
+    error = True
+    try:
+        response = get_session().request(
+            http_method, url, timeout=SLACK_TIMEOUT, **kwargs
+        )
+        error = response.status_code != 200
+        return response
+    finally:
+        request_stats.record(name, time.perf_counter() - start, error)
 
 
 class SlackApiResponse:
     def __init__(self, response: Response):
         self._response = response
-        self._data = self._response.json()
+
+    @cached_property
+    def _data(self):
+        return self._response.json()
 
     @property
     def ok(self) -> bool:
-        return self._response.status_code == 200 and self.data()["ok"]
+        return self._response.status_code == 200 and self._data["ok"]
 
     def __getattr__(self, item):
         if item not in self._data:
@@ -56,22 +165,23 @@ class SlackApiResponse:
 
 
 class SlackApi:
-    def __init__(self, bot_access_token: str):
+    def __init__(self, bot_access_token: str, team_id: str | None = None):
         self._bot_access_token = bot_access_token
+        self._team_id = team_id
 
     @classmethod
     def from_command_context(cls, context):
         bot_access_token = get_bot_access_token(context.team_id)
         if not bot_access_token:
             raise RuntimeError("Missing bot_access_token")
-        return cls(bot_access_token)
+        return cls(bot_access_token, context.team_id)
 
     @classmethod
     def from_interactive_payload(cls, payload):
         bot_access_token = get_bot_access_token(payload.team["id"])
         if not bot_access_token:
             raise RuntimeError("Missing bot_access_token")
-        return cls(bot_access_token)
+        return cls(bot_access_token, payload.team["id"])
 
     def _validate_arguments(self, method: SlackMethod, arguments: dict):
         included_arguments = set(arguments.keys())
@@ -82,12 +192,40 @@ class SlackApi:
     def _make_request(self, method: SlackMethod, arguments: dict):
         self._validate_arguments(method, arguments)
         headers = {"Authorization": f"Bearer {self._bot_access_token}"}
-        response = method.http_method(
-            method.url,
-            headers=headers,
-            json=arguments,
-        )
-        return SlackApiResponse(response)
+        key = method.bucket_key(self._team_id, arguments)
+        for attempt in range(SLACK_MAX_ATTEMPTS):
+            last_attempt = attempt == SLACK_MAX_ATTEMPTS - 1
+            reserve(key, method.tier)
+            try:
+                response = _send(
+                    method.name,
+                    method.http_method,
+                    method.url,
+                    headers=headers,
+                    json=arguments,
+                )
+            except requests.ConnectionError as e:
+                # Only a connection that was never made is safe to repeat. One
+                # dropped later may have been after Slack acted on the request.
+                if last_attempt or not _never_sent(e):
+                    raise
+                time.sleep(backoff(attempt))
+                continue
+            if response.status_code != 429 or last_attempt:
+                return self._check_token(SlackApiResponse(response))
+            # The next reserve() waits out the block along with every other
+            # worker using this bucket
+            block(key, float(response.headers.get("Retry-After", 1)))
+
+    def _check_token(self, response: SlackApiResponse) -> SlackApiResponse:
+        # Drop a cached token Slack no longer accepts so the next event reads
+        # the current one from the database
+        if (
+            response._response.status_code == 200
+            and response._data.get("error") in TOKEN_ERRORS
+        ):
+            invalidate_bot_access_token(self._team_id)
+        return response
 
     def chat_post_message(self, arguments: dict) -> SlackApiResponse:
         return self._make_request(SlackMethod.CHAT_POST_MESSAGE, arguments)
@@ -108,5 +246,7 @@ class SlackApi:
         return self._make_request(SlackMethod.REACTIONS_ADD, arguments)
 
     def interactive_response(self, payload, arguments) -> SlackApiResponse:
-        response = requests.post(payload.response_url, json=arguments)
+        response = _send(
+            "INTERACTIVE_RESPONSE", "POST", payload.response_url, json=arguments
+        )
         return SlackApiResponse(response)
@@ -0,0 +1,11 @@
+"""Regenerate meowbot/plugins/manifest.json from the plugin classes.
+
+Usage: python -m meowbot.build_manifest
+"""
+
+from meowbot.manifest import MANIFEST_PATH
+from meowbot.manifest import write_manifest
+
+if __name__ == "__main__":
+    manifest = write_manifest()
+    print(f"Wrote {len(manifest['triggers'])} triggers to {MANIFEST_PATH}")
@@ -0,0 +1,80 @@
+import time
+from datetime import datetime
+from datetime import UTC
+from functools import cached_property
+from typing import NamedTuple
+
+from meowbot.models import Cat
+from meowbot.util import get_redis
+
+# Hash with the catalog's `version`, bumped after every change to the Cat
+# table so each process knows to reload, and the time it was `updated`
+CATALOG_KEY = "cats:catalog"
+
+
+class CatPhoto(NamedTuple):
+    id: int
+    url: str
+
+
+class CatalogEntry(NamedTuple):
+    name: str
+    # 1-based position among the cat's photos, as used by `cat` and `removecat`
+    number: int
+    photo: CatPhoto
+
+
+class CatCatalog:
+    def __init__(self, version: int, updated: datetime | None, rows):
+        self.version = version
+        self.updated = updated
+        # Photos per name in registration order, names sorted
+        self._photos: dict[str, list[CatPhoto]] = {}
+        for row in rows:
+            self._photos.setdefault(row.name, []).append(CatPhoto(row.id, row.url))
+
+    @property
+    def names(self) -> list[str]:
+        return list(self._photos)
+
+    def photos(self, name: str) -> list[CatPhoto]:
+        return self._photos.get(name.lower(), [])
+
+    @cached_property
+    def _all_entries(self) -> list[CatalogEntry]:
+        return [entry for name in self._photos for entry in self.entries(name)]
+
+    def entries(self, name: str | None = None) -> list[CatalogEntry]:
+        if name is None:
+            return self._all_entries
+        name = name.lower()
+        return [
+            CatalogEntry(name, number, photo)
+            for number, photo in enumerate(self.photos(name), start=1)
+        ]
+
+
+_catalog = None
+
+
+def _get_version() -> tuple[int, datetime | None]:
+    version, updated = get_redis().hmget(CATALOG_KEY, "version", "updated")
+    if updated is not None:
+        updated = datetime.fromtimestamp(float(updated), UTC)
+    return int(version or 0), updated
+
+
+def get_catalog() -> CatCatalog:
+    global _catalog
+    version, updated = _get_version()
+    if _catalog is None or _catalog.version != version:
+        rows = Cat.query.order_by(Cat.name, Cat.id)
+        _catalog = CatCatalog(version, updated, rows)
+    return _catalog
+
+
+def bump_catalog_version():
+    pipeline = get_redis().pipeline()
+    pipeline.hincrby(CATALOG_KEY, "version", 1)
+    pipeline.hset(CATALOG_KEY, "updated", time.time())
+    pipeline.execute()
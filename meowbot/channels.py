@@ -0,0 +1,51 @@
+import json
+import os
+
+from meowbot.constants import Emoji
+
+CHANNELS_PATH = "instance/channels.json"
+
+EXTRA_CHANNELS = [
+    {"title": "youtube <video_id>", "value": f"{Emoji.YOUTUBE} Youtube video"},
+    {"title": "twitch <username>", "value": f"{Emoji.TWITCH} Twitch stream"},
+    {"title": "url <url>", "value": f"{Emoji.IE} Specified website"},
+]
+
+
+class ChannelDirectory:
+    def __init__(self, channels: dict, stamp=None):
+        self.channels = channels
+        # (mtime, size) of the file these channels were read from
+        self.stamp = stamp
+        self.aliases = sorted(channels)
+        self.available = ", ".join(self.aliases)
+        self.attachment = {
+            "pretext": "Available channels:",
+            "fallback": self.available,
+            "fields": [
+                {"title": alias, "value": channels[alias]["name"]}
+                for alias in self.aliases
+            ]
+            + EXTRA_CHANNELS,
+        }
+
+    def __contains__(self, alias):
+        return alias in self.channels
+
+    def __getitem__(self, alias):
+        return self.channels[alias]
+
+
+_directory = None
+
+
+def get_channel_directory() -> ChannelDirectory:
+    """Returns the parsed channel list, reading the file again only if it
+    has changed since it was last read"""
+    global _directory
+    stat = os.stat(CHANNELS_PATH)
+    stamp = (stat.st_mtime_ns, stat.st_size)
+    if _directory is None or _directory.stamp != stamp:
+        with open(CHANNELS_PATH, encoding="utf-8") as fp:
+            _directory = ChannelDirectory(json.load(fp), stamp)
+    return _directory
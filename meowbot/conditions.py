@@ -5,11 +5,98 @@ from abc import abstractmethod
 from meowbot.context import CommandContext
 
 
+class ActivationSummary:
+    """Necessary conditions for any of a set of conditions to hold.
+
+    Events that are not admitted by the summary cannot activate anything, so
+    they can be dropped without evaluating the conditions themselves.
+    """
+
+    def __init__(self, commands=(), reactions=(), literals=(), anything=False):
+        self.commands = set(commands)
+        self.reactions = set(reactions)
+        # (literal, ignore_case) pairs. The empty literal matches any text.
+        self.literals = set(literals)
+        self.anything = anything
+
+    @property
+    def restricted(self):
+        return not self.anything
+
+    def update(self, other):
+        self.commands |= other.commands
+        self.reactions |= other.reactions
+        self.literals |= other.literals
+        self.anything |= other.anything
+
+    def to_json(self):
+        return {
+            "commands": sorted(self.commands),
+            "reactions": sorted(self.reactions),
+            "literals": sorted(self.literals),
+            "anything": self.anything,
+        }
+
+    @classmethod
+    def from_json(cls, data):
+        return cls(
+            commands=data["commands"],
+            reactions=data["reactions"],
+            literals=(tuple(literal) for literal in data["literals"]),
+            anything=data["anything"],
+        )
+
+    def admits(self, context: CommandContext):
+        if self.anything:
+            return True
+        event = context.event
+        if event.type == "reaction_added":
+            return event.reaction in self.reactions
+        if context.command in self.commands and _is_human_message(context):
+            return True
+        if event.text is None or not self.literals:
+            return False
+        text = event.text
+        lower_text = text.lower()
+        return any(
+            literal in (lower_text if ignore_case else text)
+            for literal, ignore_case in self.literals
+        )
+
+
 class Condition(metaclass=ABCMeta):
+    # Relative cost of `evaluate` and the likelihood that it returns True. Used
+    # to order the operands of compiled And/Or conditions.
+    cost = 5.0
+    selectivity = 0.5
+    # Conditions with a memo key are evaluated at most once per CommandContext
+    memo_key = None
+
     @abstractmethod
     def evaluate(self, context: CommandContext):
         pass
 
+    def command_aliases(self):
+        """Aliases this condition is restricted to, or None if unrestricted"""
+        return None
+
+    def compile(self):
+        """Equivalent condition optimized for repeated evaluation"""
+        if self.memo_key is not None:
+            return Memoized(self)
+        return self
+
+    def summary(self):
+        return ActivationSummary(anything=True)
+
+
+def _and_rank(condition):
+    return condition.cost / max(1.0 - condition.selectivity, 1e-6)
+
+
+def _or_rank(condition):
+    return condition.cost / max(condition.selectivity, 1e-6)
+
 
 class And(Condition):
     def __init__(self, *conditions):
@@ -18,6 +105,64 @@ class And(Condition):
     def evaluate(self, context: CommandContext):
         return all(condition.evaluate(context) for condition in self._conditions)
 
+    def command_aliases(self):
+        aliases = None
+        for condition in self._conditions:
+            condition_aliases = condition.command_aliases()
+            if condition_aliases is None:
+                continue
+            if aliases is None:
+                aliases = condition_aliases
+            else:
+                aliases &= condition_aliases
+        return aliases
+
+    def summary(self):
+        # Every operand must hold, so any restricted one will do
+        for condition in self._conditions:
+            summary = condition.summary()
+            if summary.restricted:
+                return summary
+        return ActivationSummary(anything=True)
+
+    def compile(self):
+        conditions = []
+        for condition in self._conditions:
+            compiled = condition.compile()
+            if isinstance(compiled, Never):
+                return compiled
+            if isinstance(compiled, Always):
+                continue
+            if isinstance(compiled, CompiledAnd):
+                conditions.extend(compiled._conditions)
+            else:
+                conditions.append(compiled)
+        if not conditions:
+            return Always()
+        if len(conditions) == 1:
+            return conditions[0]
+        return CompiledAnd(conditions)
+
+
+class CompiledAnd(And):
+    def __init__(self, conditions):
+        super().__init__(*sorted(conditions, key=_and_rank))
+        self._evaluators = tuple(condition.evaluate for condition in self._conditions)
+        self.cost = 0.0
+        self.selectivity = 1.0
+        for condition in self._conditions:
+            self.cost += self.selectivity * condition.cost
+            self.selectivity *= condition.selectivity
+
+    def evaluate(self, context: CommandContext):
+        for evaluate in self._evaluators:
+            if not evaluate(context):
+                return False
+        return True
+
+    def compile(self):
+        return self
+
 
 class Or(Condition):
     def __init__(self, *conditions):
@@ -26,43 +171,191 @@ class Or(Condition):
     def evaluate(self, context: CommandContext):
         return any(condition.evaluate(context) for condition in self._conditions)
 
+    def command_aliases(self):
+        aliases = frozenset()
+        for condition in self._conditions:
+            condition_aliases = condition.command_aliases()
+            if condition_aliases is None:
+                return None
+            aliases |= condition_aliases
+        return aliases
+
+    def summary(self):
+        summary = ActivationSummary()
+        for condition in self._conditions:
+            summary.update(condition.summary())
+        return summary
+
+    def compile(self):
+        conditions = []
+        for condition in self._conditions:
+            compiled = condition.compile()
+            if isinstance(compiled, Always):
+                return compiled
+            if isinstance(compiled, Never):
+                continue
+            if isinstance(compiled, CompiledOr):
+                conditions.extend(compiled._conditions)
+            else:
+                conditions.append(compiled)
+        if not conditions:
+            return Never()
+        if len(conditions) == 1:
+            return conditions[0]
+        return CompiledOr(conditions)
+
+
+class CompiledOr(Or):
+    def __init__(self, conditions):
+        super().__init__(*sorted(conditions, key=_or_rank))
+        self._evaluators = tuple(condition.evaluate for condition in self._conditions)
+        self.cost = 0.0
+        miss_probability = 1.0
+        for condition in self._conditions:
+            self.cost += miss_probability * condition.cost
+            miss_probability *= 1.0 - condition.selectivity
+        self.selectivity = 1.0 - miss_probability
+
+    def evaluate(self, context: CommandContext):
+        for evaluate in self._evaluators:
+            if evaluate(context):
+                return True
+        return False
+
+    def compile(self):
+        return self
+
 
 class Not(Condition):
     def __init__(self, condition):
         self._condition = condition
+        self.cost = condition.cost
+        self.selectivity = 1.0 - condition.selectivity
 
     def evaluate(self, context: CommandContext):
         return not self._condition.evaluate(context)
 
+    def compile(self):
+        compiled = self._condition.compile()
+        if isinstance(compiled, Not):
+            return compiled._condition
+        if isinstance(compiled, Always):
+            return Never()
+        if isinstance(compiled, Never):
+            return Always()
+        return Not(compiled)
+
+
+class Memoized(Condition):
+    def __init__(self, condition):
+        self._condition = condition
+        self._key = condition.memo_key
+        self.cost = condition.cost
+        self.selectivity = condition.selectivity
+
+    def evaluate(self, context: CommandContext):
+        memo = getattr(context, "_condition_memo", None)
+        if memo is None:
+            memo = context._condition_memo = {}
+        if self._key not in memo:
+            memo[self._key] = bool(self._condition.evaluate(context))
+        return memo[self._key]
+
+    def command_aliases(self):
+        return self._condition.command_aliases()
+
+    def summary(self):
+        return self._condition.summary()
+
+    def compile(self):
+        return self
+
 
 class Always(Condition):
+    cost = 0.0
+    selectivity = 1.0
+
     def evaluate(self, context: CommandContext):
         return True
 
 
 class Never(Condition):
+    cost = 0.0
+    selectivity = 0.0
+
     def evaluate(self, context: CommandContext):
         return False
 
+    def command_aliases(self):
+        return frozenset()
+
+    def summary(self):
+        return ActivationSummary()
+
+
+def _is_human_message(context: CommandContext):
+    if context.event.subtype in (
+        "bot_message",
+        "message_changed",
+        "message_deleted",
+    ):
+        return False
+    return not hasattr(context.event, "bot_id")
+
+
+class IsHumanMessage(Condition):
+    cost = 1.0
+    selectivity = 0.9
+    memo_key = "IsHumanMessage"
+
+    def evaluate(self, context: CommandContext):
+        return _is_human_message(context)
+
+
+class _HasCommand(Condition):
+    cost = 1.0
+    selectivity = 0.05
+
+    def __init__(self, aliases):
+        self._aliases = frozenset(aliases)
+
+    def evaluate(self, context: CommandContext):
+        return context.command in self._aliases
+
+    def command_aliases(self):
+        return self._aliases
+
+    def summary(self):
+        return ActivationSummary(commands=self._aliases)
+
 
 class IsCommand(Condition):
+    cost = 2.0
+    selectivity = 0.05
+
     def __init__(self, aliases):
         self._name = aliases[0]
         self._aliases = set(aliases)
 
     def evaluate(self, context: CommandContext):
-        if context.event.subtype in (
-            "bot_message",
-            "message_changed",
-            "message_deleted",
-        ):
-            return False
-        if hasattr(context.event, "bot_id"):
+        if not _is_human_message(context):
             return False
         return context.command in self._aliases
 
+    def command_aliases(self):
+        return frozenset(self._aliases)
+
+    def summary(self):
+        return ActivationSummary(commands=self._aliases)
+
+    def compile(self):
+        return CompiledAnd([IsHumanMessage().compile(), _HasCommand(self._aliases)])
+
 
 class IsReaction(Condition):
+    cost = 1.0
+    selectivity = 0.05
+
     def __init__(self, reactions):
         self._reactions = set(reactions)
 
@@ -72,8 +365,14 @@ class IsReaction(Condition):
             and context.event.reaction in self._reactions
         )
 
+    def summary(self):
+        return ActivationSummary(reactions=self._reactions)
+
 
 class InChannel(Condition):
+    cost = 1.0
+    selectivity = 0.2
+
     def __init__(self, channels):
         self._channels = set(channels)
 
@@ -82,6 +381,9 @@ class InChannel(Condition):
 
 
 class IsUser(Condition):
+    cost = 1.0
+    selectivity = 0.1
+
     def __init__(self, users):
         self._users = set(users)
 
@@ -89,11 +391,181 @@ class IsUser(Condition):
         return context.event.user in self._users
 
 
+_INLINE_FLAGS = (
+    (re.ASCII, "a"),
+    (re.IGNORECASE, "i"),
+    (re.MULTILINE, "m"),
+    (re.DOTALL, "s"),
+    (re.VERBOSE, "x"),
+)
+
+
+# Escapes that stand for a character class or a zero-width assertion, so they
+# only ever interrupt a literal
+_CLASS_ESCAPES = frozenset("bBAZdDsSwW")
+
+
+def _required_literal(regex):
+    """Longest literal substring every match of `regex` must contain, if any"""
+    if regex.flags & re.VERBOSE:
+        return None
+    pattern = regex.pattern
+    best = current = ""
+    depth = 0
+    last_literal = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        literal = None
+        if char == "\\":
+            escaped = pattern[i + 1 : i + 2]
+            if escaped.isalnum() and escaped not in _CLASS_ESCAPES:
+                # \x41, \u..., \N{...}, octal and backreferences span more
+                # than two characters or stand for characters of their own
+                return None
+            if escaped and not escaped.isalnum():
+                literal = escaped
+            i += 2
+        elif char == "[":
+            i += 1
+            if pattern[i : i + 1] == "^":
+                i += 1
+            if pattern[i : i + 1] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+        elif char in "*+?{":
+            if last_literal:
+                current = current[:-1]
+            if char == "{":
+                end = pattern.find("}", i)
+                i = len(pattern) if end == -1 else end
+            i += 1
+        else:
+            if char == "(":
+                depth += 1
+            elif char == ")":
+                depth -= 1
+            elif char == "|" and depth == 0:
+                return None
+            elif char not in ".^$":
+                literal = char
+            i += 1
+
+        if literal is not None and depth == 0:
+            current += literal
+            last_literal = True
+        else:
+            best = max(best, current, key=len)
+            current = ""
+            last_literal = False
+    best = max(best, current, key=len)
+    return best or None
+
+
+class TextMatcher:
+    """Scans message text once for every registered pattern.
+
+    Each pattern is prefiltered by the longest literal it requires, then all
+    remaining candidates are found with a single combined regex.
+    """
+
+    def __init__(self):
+        self._patterns = []
+        self._combined = None
+
+    def register(self, regex):
+        literal = _required_literal(regex)
+        ignore_case = bool(regex.flags & re.IGNORECASE)
+        if literal is not None and ignore_case:
+            literal = literal.lower()
+        self._patterns.append((regex, literal, ignore_case))
+        self._combined = None
+        return len(self._patterns) - 1
+
+    def required_literal(self, index):
+        """(literal, ignore_case) for a registered pattern; literal may be None"""
+        _, literal, ignore_case = self._patterns[index]
+        return literal, ignore_case
+
+    def _compile(self):
+        groups = {}
+        standalone = set()
+        parts = []
+        for index, (regex, _, _) in enumerate(self._patterns):
+            flags = "".join(
+                letter for flag, letter in _INLINE_FLAGS if regex.flags & flag
+            )
+            part = f"(?P<_m{index}>(?{flags}:{regex.pattern}))"
+            # Numbered backreferences would be shifted by the wrapping groups,
+            # and group names can clash with other patterns'
+            if regex.groupindex or (
+                regex.groups and re.search(r"\\[1-9]", regex.pattern)
+            ):
+                standalone.add(index)
+                continue
+            try:
+                re.compile("|".join([*parts, part]))
+            except re.error:
+                standalone.add(index)
+                continue
+            groups[f"_m{index}"] = index
+            parts.append(part)
+        combined = re.compile("|".join(parts)) if parts else None
+        self._combined = (combined, groups, standalone)
+
+    def scan(self, text):
+        if text is None:
+            return frozenset()
+        if self._combined is None:
+            self._compile()
+        combined, groups, standalone = self._combined
+
+        lower_text = text.lower()
+        candidates = {
+            index
+            for index, (_, literal, ignore_case) in enumerate(self._patterns)
+            if literal is None or literal in (lower_text if ignore_case else text)
+        }
+        if not candidates:
+            return frozenset()
+
+        fired = set()
+        if combined is not None and candidates - standalone:
+            fired.update(groups[match.lastgroup] for match in combined.finditer(text))
+        # Matches can overlap, so a pattern shadowed by another one's match has to
+        # be checked on its own. If nothing matched at all, nothing else can.
+        recheck = candidates - fired
+        if not fired:
+            recheck &= standalone
+        fired.update(
+            index for index in recheck if self._patterns[index][0].search(text)
+        )
+        return frozenset(fired)
+
+    def matches(self, context: CommandContext):
+        cached = getattr(context, "_text_matches", None)
+        if cached is None or cached[0] != len(self._patterns):
+            cached = (len(self._patterns), self.scan(context.event.text))
+            context._text_matches = cached
+        return cached[1]
+
+
+text_matcher = TextMatcher()
+
+
 class RegexMatch(Condition):
+    cost = 10.0
+    selectivity = 0.05
+
     def __init__(self, pattern, flags=0):
         self._regex = re.compile(pattern, flags=flags)
+        self._index = text_matcher.register(self._regex)
 
     def evaluate(self, context: CommandContext):
-        if context.event.text is None:
-            return False
-        return self._regex.search(context.event.text)
+        return self._index in text_matcher.matches(context)
+
+    def summary(self):
+        literal, ignore_case = text_matcher.required_literal(self._index)
+        return ActivationSummary(literals=[(literal or "", ignore_case)])
@@ -110,6 +110,23 @@ class InteractivePayload:
     def actions(self):
         return self._actions
 
+    def command_context(self, action: "SlackAction") -> CommandContext:
+        """A context for the direct message that would have run `action`'s
+        command, for evaluating the conditions of the command handling it"""
+        return CommandContext(
+            {
+                "event": {
+                    "type": "message",
+                    "channel_type": "im",
+                    "channel": self._data.get("channel", {}).get("id"),
+                    "user": self._data.get("user", {}).get("id"),
+                    "text": action.command,
+                },
+                "authed_users": [None],
+                "team_id": self._data.get("team", {}).get("id"),
+            }
+        )
+
     def __getattr__(self, item):
         if item not in self._data:
             raise AttributeError(item)
@@ -122,7 +139,8 @@ class SlackAction:
         self._command, self._action_name = self._parse_action_id()
 
     def _parse_action_id(self):
-        return self.action_id.split(":")
+        command, _, action_name = self._action.get("action_id", "").partition(":")
+        return command, action_name
 
     @property
     def command(self):
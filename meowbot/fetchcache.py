@@ -0,0 +1,166 @@
+"""Shared cache for data fetched from external APIs.
+
+Parsed values are kept in process (L1) in front of the raw response in Redis
+(L2). Within `soft_ttl` a value is served as is. Until `hard_ttl` it is still
+served, while one worker refetches it in the background. Past that, callers
+wait for a fetch that only one worker makes at a time. If the fetch fails, the
+last value this process saw is served instead.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+
+from redis.exceptions import LockError
+
+import meowbot
+from meowbot.cache import LRUCache
+from meowbot.cache import MISSING
+from meowbot.cache import SingleFlight
+from meowbot.util import get_redis
+from meowbot.util import submit
+
+# Every FetchCache by name, for reporting their stats
+fetch_caches = {}
+
+
+class FetchCache:
+    def __init__(
+        self,
+        name: str,
+        fetch,
+        parse=json.loads,
+        soft_ttl: float = 5 * 60,
+        hard_ttl: float = 60 * 60,
+        maxsize: int = 128,
+    ):
+        self.name = name
+        self.fetch = fetch
+        self.parse = parse
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        # Redis key -> (parsed value, time it was fetched)
+        self._local = LRUCache(maxsize)
+        self._flights = SingleFlight()
+        self._lock = threading.Lock()
+        self._revalidating = set()
+        self._stats = Counter()
+        fetch_caches[name] = self
+
+    def get(self, key: str, *args):
+        """Returns the parsed data for `key`, calling `fetch(*args)` if needed"""
+        redis_key = self._redis_key(key)
+        entry = self._local.get(redis_key)
+        if entry is not MISSING and time.time() - entry[1] < self.soft_ttl:
+            self._count("local_hit")
+            return entry[0]
+
+        stored = self._load(redis_key, entry)
+        if stored is not MISSING:
+            entry = stored
+            age = time.time() - entry[1]
+            if age < self.soft_ttl:
+                self._count("redis_hit")
+                return entry[0]
+            if age < self.hard_ttl:
+                self._count("stale")
+                self._revalidate(redis_key, args)
+                return entry[0]
+
+        self._count("miss")
+        try:
+            return self._flights.do(redis_key, self._refresh, redis_key, args, True)
+        except Exception:
+            if entry is MISSING:
+                raise
+            self._count("stale_if_error")
+            meowbot.log.exception(f"Serving stale {redis_key} after fetch failed")
+            return entry[0]
+
+    def prewarm(self, key: str, *args, lead: float) -> bool:
+        """Fetches the data for `key` if it is missing or expires within `lead`
+        seconds, unless another worker already is. Returns whether it did."""
+        redis_key = self._redis_key(key)
+        fetched_at = get_redis().hget(redis_key, "fetched_at")
+        if (
+            fetched_at is not None
+            and time.time() - float(fetched_at) < self.hard_ttl - lead
+        ):
+            return False
+        if self._refresh(redis_key, args, False) is None:
+            return False
+        self._count("prewarm")
+        return True
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._stats)
+
+    def _redis_key(self, key):
+        return f"fetch:{self.name}:{key}"
+
+    def _count(self, stat):
+        with self._lock:
+            self._stats[stat] += 1
+
+    def _load(self, redis_key, entry):
+        data, fetched_at = get_redis().hmget(redis_key, "data", "fetched_at")
+        if data is None:
+            return MISSING
+        fetched_at = float(fetched_at)
+        # Only parse what this process hasn't already parsed
+        if entry is MISSING or entry[1] != fetched_at:
+            entry = (self.parse(data), fetched_at)
+            self._local.set(redis_key, entry)
+        return entry
+
+    def _refresh(self, redis_key, args, wait):
+        """Fetches and stores the data, unless another worker already is.
+
+        When `wait` is set, waits for that worker and returns what it stored.
+        Otherwise returns None without fetching.
+        """
+        redis = get_redis()
+        lock = redis.lock(f"{redis_key}:lock", timeout=60)
+        if not lock.acquire(blocking=wait, blocking_timeout=30):
+            if not wait:
+                return None
+            # Whoever holds the lock is stuck; fetch anyway
+        try:
+            if wait:
+                entry = self._load(redis_key, self._local.get(redis_key))
+                if entry is not MISSING and time.time() - entry[1] < self.soft_ttl:
+                    return entry[0]
+
+            data = self.fetch(*args)
+            fetched_at = time.time()
+            # Parsed before storing so a malformed response is never cached
+            value = self.parse(data)
+            pipeline = redis.pipeline()
+            pipeline.hset(redis_key, mapping={"data": data, "fetched_at": fetched_at})
+            pipeline.expire(redis_key, int(self.hard_ttl))
+            pipeline.execute()
+            self._local.set(redis_key, (value, fetched_at))
+            return value
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
+
+    def _revalidate(self, redis_key, args):
+        with self._lock:
+            if redis_key in self._revalidating:
+                return
+            self._revalidating.add(redis_key)
+        submit("fetch", self._revalidate_in_background, redis_key, args)
+
+    def _revalidate_in_background(self, redis_key, args):
+        try:
+            self._refresh(redis_key, args, False)
+        except Exception:
+            meowbot.log.exception(f"Background refresh of {redis_key} failed")
+        finally:
+            with self._lock:
+                self._revalidating.discard(redis_key)
@@ -0,0 +1,114 @@
+"""Manifest of every trigger defined in meowbot.plugins.
+
+The manifest records what each trigger needs to see in an event (see
+ActivationSummary), its help text, and its priority. With it, plugin modules
+only have to be imported once one of their triggers can actually fire.
+
+Regenerate it with: python -m meowbot.build_manifest
+"""
+
+import hashlib
+import importlib
+import json
+import os
+from functools import lru_cache
+
+import meowbot
+from meowbot.conditions import ActivationSummary
+
+# Kept importable without meowbot.plugins, so the web app can use the manifest
+# without loading any plugin code
+PLUGINS_PACKAGE = "meowbot.plugins"
+PACKAGE_DIR = os.path.dirname(__file__)
+PLUGINS_DIR = os.path.join(PACKAGE_DIR, "plugins")
+MANIFEST_PATH = os.path.join(PLUGINS_DIR, "manifest.json")
+# Besides the plugins themselves, these determine what the manifest contains
+MANIFEST_SOURCES = ("conditions.py", "triggers.py")
+
+
+def get_source_hash():
+    paths = [os.path.join(PACKAGE_DIR, source) for source in MANIFEST_SOURCES]
+    paths.extend(
+        os.path.join(PLUGINS_DIR, filename)
+        for filename in sorted(os.listdir(PLUGINS_DIR))
+        if filename.endswith(".py")
+    )
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, "rb") as fp:
+            digest.update(fp.read())
+    return digest.hexdigest()
+
+
+class Manifest:
+    def __init__(self, data):
+        self.triggers = data["triggers"]
+        self.module_summaries = {}
+        self.action_modules = {}
+        self.summary = ActivationSummary()
+        for entry in self.triggers:
+            summary = ActivationSummary.from_json(entry["summary"])
+            self.module_summaries.setdefault(entry["module"], ActivationSummary())
+            self.module_summaries[entry["module"]].update(summary)
+            self.summary.update(summary)
+            if entry["interactive"]:
+                for alias in entry["aliases"]:
+                    self.action_modules[alias] = entry["module"]
+
+    def modules_for(self, context, exclude=()):
+        """Plugin modules with a trigger that may activate for `context`"""
+        return [
+            module
+            for module, summary in self.module_summaries.items()
+            if module not in exclude and summary.admits(context)
+        ]
+
+
+def build_manifest():
+    # Importing the trigger system here keeps this module cheap to import
+    from meowbot.triggers import load_all_plugins
+    from meowbot.triggers import trigger_registry
+
+    load_all_plugins()
+    triggers = []
+    for trigger_cls in trigger_registry:
+        description = trigger_cls.describe()
+        if description["module"] is not None:
+            triggers.append(description)
+    return {"source_hash": get_source_hash(), "triggers": triggers}
+
+
+def write_manifest(path=MANIFEST_PATH):
+    manifest = build_manifest()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+    return manifest
+
+
+@lru_cache(maxsize=1)
+def get_manifest():
+    """The plugin manifest, or None if it is missing or out of date"""
+    try:
+        with open(MANIFEST_PATH) as fp:
+            data = json.load(fp)
+    except (OSError, ValueError):
+        meowbot.log.warning(f"Plugin manifest not found at {MANIFEST_PATH}")
+        return None
+    if data.get("source_hash") != get_source_hash():
+        meowbot.log.warning(f"Plugin manifest at {MANIFEST_PATH} is out of date")
+        return None
+    return Manifest(data)
+
+
+def plugin_module_name(module_path):
+    """Name of a plugin module relative to meowbot.plugins, or None"""
+    prefix = f"{PLUGINS_PACKAGE}."
+    if not module_path.startswith(prefix):
+        return None
+    return module_path[len(prefix) :]
+
+
+def import_plugin(module):
+    return importlib.import_module(f"{PLUGINS_PACKAGE}.{module}")
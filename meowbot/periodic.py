@@ -0,0 +1,40 @@
+from datetime import datetime
+from datetime import UTC
+
+import meowbot
+from meowbot.util import get_scheduler
+
+# Queue for slow background jobs, served by its own worker so they never hold
+# up the Slack events on the default queue
+PERIODIC_QUEUE = "periodic"
+
+# (job id, function, seconds between runs, queue) for jobs rq-scheduler repeats
+PERIODIC_JOBS = [
+    ("purpleair-ingest", "meowbot.purpleair.ingest_sensors", 5 * 60, PERIODIC_QUEUE),
+    ("prewarm", "meowbot.prewarm.prewarm_caches", 10 * 60, PERIODIC_QUEUE),
+]
+
+
+def register_periodic_jobs():
+    """Schedules every periodic job, leaving alone any already scheduled with
+    the same function, interval and queue"""
+    scheduler = get_scheduler()
+    for job_id, func, interval, queue_name in PERIODIC_JOBS:
+        if job_id in scheduler:
+            job = scheduler.job_class.fetch(job_id, connection=scheduler.connection)
+            if (
+                job.func_name == func
+                and job.meta.get("interval") == interval
+                and job.origin == queue_name
+            ):
+                continue
+            scheduler.cancel(job_id)
+        meowbot.log.info(f"Scheduling {func} every {interval}s on {queue_name}")
+        scheduler.schedule(
+            scheduled_time=datetime.now(UTC),
+            func=func,
+            interval=interval,
+            repeat=None,
+            id=job_id,
+            queue_name=queue_name,
+        )
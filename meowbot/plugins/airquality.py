@@ -1,17 +1,47 @@
-import json
+import re
 import time
 
+import numpy as np
 import requests
-from geopy.distance import distance
 
 from meowbot.conditions import IsCommand
 from meowbot.context import CommandContext
+from meowbot.fetchcache import FetchCache
+from meowbot.purpleair import aqi_band
+from meowbot.purpleair import BANDS
+from meowbot.purpleair import get_sensor_index
 from meowbot.triggers import SimpleResponseCommand
 from meowbot.util import get_airnow_api_key
 from meowbot.util import get_default_zip_code
 from meowbot.util import get_location
 from meowbot.util import get_redis
 
+USER_LOCATION = "user_location"
+AREA_MILES = 10.0
+MAX_AREA_MILES = 100.0
+GRID_MILES = 20.0
+RADIUS_PATTERN = re.compile(r"(\d+(?:\.\d+)?)mi(?:les?)?", re.IGNORECASE)
+
+
+def fetch_airnow_observations(zip_code):
+    response = requests.get(
+        "http://www.airnowapi.org/aq/observation/zipCode/current/",
+        params={
+            "API_KEY": get_airnow_api_key(),
+            "distance": 25,
+            "zipCode": zip_code,
+            "format": "application/json",
+        },
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.content
+
+
+airnow_cache = FetchCache(
+    "aqi", fetch_airnow_observations, soft_ttl=10 * 60, hard_ttl=2 * 60 * 60
+)
+
 
 class AirQuality(SimpleResponseCommand):
     condition = IsCommand(["airquality", "aqi", "airnow", "air"])
@@ -27,25 +57,7 @@ class AirQuality(SimpleResponseCommand):
         else:
             zip_code = get_default_zip_code()
 
-        redis = get_redis()
-
-        key = f"aqi:{zip_code}"
-        data = redis.get(key)
-        if data is None:
-            airnow_api_key = get_airnow_api_key()
-            observation_url = "http://www.airnowapi.org/aq/observation/zipCode/current/"
-            data = requests.get(
-                observation_url,
-                params={
-                    "API_KEY": airnow_api_key,
-                    "distance": 25,
-                    "zipCode": zip_code,
-                    "format": "application/json",
-                },
-            ).content
-            redis.set(key, data, ex=10 * 60)
-
-        observations = json.loads(data.decode("utf-8"))
+        observations = airnow_cache.get(zip_code, zip_code)
 
         # https://docs.airnowapi.org/aq101
         category_color_map = {
@@ -97,58 +109,32 @@ class AirQuality(SimpleResponseCommand):
         }
 
 
-USER_LOCATION = "user_location"
-PURPLEAIR_DATA_URL = "https://www.purpleair.com/json"
-# https://docs.airnowapi.org/aq101
-# https://www.airnow.gov/sites/default/files/2018-05/aqi-technical-assistance-document-may2016.pdf
-BANDS = [
-    {
-        "pm25": (0.0, 12.0),
-        "aqi": (0, 50),
-        "color": "#00e400",  # Good - Green
-        "name": "Good",
-    },
-    {
-        "pm25": (12.1, 35.4),
-        "aqi": (51, 100),
-        "color": "#ffff00",  # Moderate - Yellow
-        "name": "Moderate",
-    },
-    {
-        "pm25": (35.5, 55.4),
-        "aqi": (101, 150),
-        "color": "#ff7e00",  # USG - Orange
-        "name": "Unhealthy for Sensitive Groups",
-    },
-    {
-        "pm25": (55.5, 150.4),
-        "aqi": (151, 200),
-        "color": "#ff0000",  # Unhealthy - Red,
-        "name": "Unhealthy",
-    },
-    {
-        "pm25": (150.5, 250.4),
-        "aqi": (201, 300),
-        "color": "#99004c",  # Very Unhealthy - Purple
-        "name": "Very Unhealthy",
-    },
-    {
-        "pm25": (250.5, 500.4),
-        "aqi": (301, 500),
-        "color": "#7e0023",  # Hazardous - Maroon,
-        "name": "Hazardous",
-    },
-]
-
-
 class PurpleAir(SimpleResponseCommand):
     condition = IsCommand(["purpleair", "purple"])
-    help = "`purpleair [location]`: get PurpleAir air quality information"
+    help = (
+        "`purpleair [location]`: get PurpleAir air quality information\n"
+        "`purpleair area [<miles>mi] [location]`: median AQI within `miles` "
+        f"(default {AREA_MILES:.0f}mi)\n"
+        f"`purpleair grid [location]`: map of AQI within {GRID_MILES:.0f} miles"
+    )
 
     def get_message_args(self, context: CommandContext):
+        args = context.args
+        subcommand = None
+        if len(args) >= 1 and args[0] in ("area", "grid"):
+            subcommand, args = args[0], args[1:]
+        max_miles = AREA_MILES if subcommand == "area" else GRID_MILES
+        # A bare number is a zip code, so the radius needs its unit
+        radius = RADIUS_PATTERN.fullmatch(args[0]) if args else None
+        if subcommand == "area" and radius:
+            max_miles = float(radius[1])
+            if not 0 < max_miles <= MAX_AREA_MILES:
+                return {"text": f"Area must be up to {MAX_AREA_MILES:g} miles"}
+            args = args[1:]
+
         redis = get_redis()
-        if len(context.args) >= 1:
-            query = " ".join(context.args)
+        if len(args) >= 1:
+            query = " ".join(args)
         else:
             if redis.hexists(USER_LOCATION, context.event.user):
                 query = redis.hget(USER_LOCATION, context.event.user).decode("utf-8")
@@ -159,84 +145,90 @@ class PurpleAir(SimpleResponseCommand):
         if location is None:
             return {"text": f"Location `{query}` not found"}
         location_coords = (float(location["lat"]), float(location["lon"]))
-
-        key = "purpleair"
-        data = redis.get(key)
-        if data is None:
-            data = requests.get(PURPLEAIR_DATA_URL).content
-            redis.set(key, data, ex=5 * 60)
-
-        results = json.loads(data.decode("utf-8"))["results"]
-
-        filtered_points = [
-            point
-            for point in results
-            if (
-                point.get("DEVICE_LOCATIONTYPE") == "outside"
-                and "Lat" in point
-                and "Lon" in point
-                and point["AGE"] <= 30
-            )
-        ]
-        child_points = {
-            point["ParentID"]: point for point in results if "ParentID" in point
-        }
-        point_distances = (
-            (point, distance((point["Lat"], point["Lon"]), location_coords))
-            for point in filtered_points
-        )
-        point_distances = sorted(
-            filter(lambda p_d: p_d[1].miles <= 25.0, point_distances),
-            key=lambda p_d: p_d[1],
+        map_url = (
+            "https://www.purpleair.com/map?opt=1/i/mAQI/a10/cC0#13.0/"
+            f"{location_coords[0]}/{location_coords[1]}"
         )
-        closest_points = point_distances[:3]
-        if len(closest_points) == 0:
+        place = f"<{map_url}|{location['display_name']}>"
+
+        index = get_sensor_index()
+        if index is None:
+            return {"text": "PurpleAir data is still loading, try again in a minute"}
+        if subcommand == "area":
+            return self.area_message(index, location_coords, max_miles, place)
+        if subcommand == "grid":
+            return self.grid_message(index, location_coords, max_miles, place)
+
+        closest_sensors = index.nearest(location_coords, max_miles=25.0, count=3)
+        if len(closest_sensors) == 0:
             return {
                 "text": "No PurpleAir sensor within 25 miles of "
                 f"{location['display_name']}"
             }
 
-        def build_attachment(point, distance):
-            pm25_10_min_avg = json.loads(point["Stats"])["v1"]
-            flagged = "Flag" in point
-            child_point = child_points.get(point["ID"])
-            if child_point:
-                pm25_10_min_avg = (
-                    pm25_10_min_avg + json.loads(child_point["Stats"])["v1"]
-                ) / 2
-                flagged |= "Flag" in child_point
-
-            for band in BANDS:
-                lower_pm, upper_pm = band["pm25"]
-                lower_aqi, upper_aqi = band["aqi"]
-                color = band["color"]
-                name = band["name"]
-                if pm25_10_min_avg <= upper_pm:
-                    # https://en.wikipedia.org/wiki/Air_quality_index#Computing_the_AQI
-                    ten_min_aqi = (upper_aqi - lower_aqi) / (upper_pm - lower_pm) * (
-                        pm25_10_min_avg - lower_pm
-                    ) + lower_aqi
-                    break
-
+        def build_attachment(sensor, distance):
+            band = BANDS[sensor.band]
+            minutes_ago = (time.time() - sensor.last_seen) / 60
             return {
-                "fallback": f"{ten_min_aqi} - {name}",
-                "color": color,
-                "text": f"{ten_min_aqi:.0f} - {name}",
-                "footer": "{} | {:.1f} mi away | reported {:.0f} minutes ago".format(
-                    point["Label"],
-                    distance.miles,
-                    (time.time() - point["LastSeen"]) / 60,
+                "fallback": f"{sensor.aqi:.0f} - {band['name']}",
+                "color": band["color"],
+                "text": f"{sensor.aqi:.0f} - {band['name']}",
+                "footer": (
+                    f"{sensor.label} | {distance.miles:.1f} mi away | "
+                    f"reported {minutes_ago:.0f} minutes ago"
                 ),
             }
 
-        map_url = (
-            "https://www.purpleair.com/map?opt=1/i/mAQI/a10/cC0#13.0/"
-            f"{location_coords[0]}/{location_coords[1]}"
-        )
         return {
-            "text": f"PurpleAir sensors near <{map_url}|{location['display_name']}>:",
+            "text": f"PurpleAir sensors near {place}:",
             "icon_emoji": ":purpleair:",
             "attachments": [
-                build_attachment(point, distance) for point, distance in closest_points
+                build_attachment(sensor, distance)
+                for sensor, distance in closest_sensors
             ],
         }
+
+    @staticmethod
+    def area_message(index, location_coords, max_miles, place):
+        aqi = index.area(location_coords, max_miles)
+        if len(aqi) == 0:
+            return {
+                "text": f"No PurpleAir sensor within {max_miles:g} miles of {place}"
+            }
+        median = float(np.median(aqi))
+        band = BANDS[aqi_band(median)]
+        return {
+            "text": f"PurpleAir sensors within {max_miles:g} miles of {place}:",
+            "icon_emoji": ":purpleair:",
+            "attachments": [
+                {
+                    "fallback": f"{median:.0f} - {band['name']}",
+                    "color": band["color"],
+                    "text": f"Median {median:.0f} - {band['name']}",
+                    "footer": (
+                        f"{len(aqi)} sensors | lowest {aqi.min():.0f} | "
+                        f"highest {aqi.max():.0f}"
+                    ),
+                }
+            ],
+        }
+
+    @staticmethod
+    def grid_message(index, location_coords, max_miles, place):
+        grid = index.grid(location_coords, max_miles)
+        rows = [
+            "".join(
+                ":white_large_square:"
+                if np.isnan(aqi)
+                else BANDS[aqi_band(aqi)]["emoji"]
+                for aqi in row
+            )
+            for row in grid
+        ]
+        return {
+            "text": (
+                f"Median AQI within {max_miles:g} miles of {place}, north up:\n"
+                + "\n".join(rows)
+            ),
+            "icon_emoji": ":purpleair:",
+        }
@@ -58,7 +58,7 @@ class No(SimpleResponseCommand):
 
 class Hmm(SimpleResponseCommand):
     condition = IsCommand(["hmm", "think", "thinking"])
-    help = ("`hmm`: thinking...",)
+    help = "`hmm`: thinking..."
 
     def get_message_args(self, context: CommandContext):
         return {"text": str(random.choice(list(Emoji.thinking())))}
@@ -84,7 +84,7 @@ class Nyan(SimpleResponseCommand):
 
 class High5(SimpleResponseCommand):
     condition = IsCommand(["high5", "highfive", "hi5"])
-    help = ("`high5`: give meowbot a high five",)
+    help = "`high5`: give meowbot a high five"
     aliases = ["highfive"]
 
     def get_message_args(self, context: CommandContext):
@@ -4,6 +4,8 @@ import requests
 import validators
 
 import meowbot
+from meowbot.catalog import bump_catalog_version
+from meowbot.catalog import get_catalog
 from meowbot.conditions import IsCommand
 from meowbot.context import CommandContext
 from meowbot.models import Cat
@@ -18,28 +20,21 @@ class CatCommand(SimpleResponseCommand):
     def get_message_args(self, context: CommandContext):
         if len(context.args) in (1, 2):
             name = context.args[0]
-            num_photos = Cat.query.filter_by(name=name.lower()).count()
-            if num_photos == 0:
+            photos = get_catalog().photos(name)
+            if not photos:
                 return {"text": f"No cats named {name} registered"}
             if len(context.args) == 2:
                 number = context.args[1]
                 if not number.isnumeric():
                     return {"text": f"Second argument must be a number. Got `{number}`"}
                 number = int(number)
-                if 1 <= number <= num_photos:
-                    offset = number - 1
+                if 1 <= number <= len(photos):
+                    photo = photos[number - 1]
                 else:
-                    offset = random.randint(0, num_photos - 1)
+                    photo = random.choice(photos)
             else:
-                offset = random.randint(0, num_photos - 1)
-            row = (
-                Cat.query.filter_by(name=name.lower())
-                .order_by(Cat.id)
-                .limit(1)
-                .offset(offset)
-                .one()
-            )
-            self.image_url = row.url
+                photo = random.choice(photos)
+            self.image_url = photo.url
             self.alt_text = name
         else:
             self.image_url = requests.head(
@@ -93,6 +88,7 @@ class AddCat(SimpleResponseCommand):
         row = Cat(name=name.lower(), url=url)
         meowbot.db.session.add(row)
         meowbot.db.session.commit()
+        bump_catalog_version()
         return {
             "attachments": [{"text": f"Registered {name}!", "image_url": url}],
             "thread_ts": context.event.ts,
@@ -104,8 +100,7 @@ class ListCats(SimpleResponseCommand):
     help = "`listcats`: see all cats available for the `cat` command"
 
     def get_message_args(self, context: CommandContext):
-        rows = meowbot.db.session.query(Cat.name).distinct()
-        names = ", ".join(row.name for row in rows)
+        names = ", ".join(get_catalog().names)
         return {"text": f"Cats in database: {names}"}
 
 
@@ -124,15 +119,13 @@ class RemoveCat(SimpleResponseCommand):
         offset = int(number)
         if offset <= 0:
             return {"text": f"Number must be > 0. Got `{offset}`"}
-        row = (
-            Cat.query.filter_by(name=name.lower())
-            .order_by(Cat.id)
-            .limit(1)
-            .offset(offset - 1)
-            .one_or_none()
-        )
+        photos = get_catalog().photos(name)
+        row = None
+        if offset <= len(photos):
+            row = meowbot.db.session.get(Cat, photos[offset - 1].id)
         if row is None:
             return {"text": "No matching rows"}
         meowbot.db.session.delete(row)
         meowbot.db.session.commit()
+        bump_catalog_version()
         return {"text": "Successfully removed!"}
@@ -1,13 +1,72 @@
+import json
+from datetime import datetime
 from datetime import timedelta
+from datetime import UTC
+from typing import NamedTuple
 
-import arrow
-import ics
 import requests
 
 from meowbot.conditions import IsCommand
 from meowbot.context import CommandContext
+from meowbot.fetchcache import FetchCache
+from meowbot.streaming import iter_ical_events
 from meowbot.triggers import SimpleResponseCommand
-from meowbot.util import get_redis
+
+# Concerts that started longer ago than this aren't listed
+STARTED_WITHIN = timedelta(hours=3)
+
+
+class Concert(NamedTuple):
+    name: str
+    url: str
+    description: str
+    begin: datetime
+    end: datetime
+
+
+def fetch_concert_calendar():
+    """Streams the festival calendar, keeping only the concerts that can still
+    be listed"""
+    cutoff = datetime.now(UTC) - STARTED_WITHIN
+    with requests.get(
+        "https://ybgfestival.org/events/?ical=1&tribe_display=list",
+        timeout=10,
+        stream=True,
+    ) as response:
+        response.raise_for_status()
+        events = [
+            event
+            for event in iter_ical_events(response.iter_lines())
+            if event["begin"] > cutoff
+        ]
+    events.sort(key=lambda event: event["begin"])
+    for event in events:
+        event["begin"] = event["begin"].isoformat()
+        event["end"] = event["end"].isoformat()
+    return json.dumps(events)
+
+
+def parse_concert_calendar(data):
+    return [
+        Concert(
+            event["name"],
+            event["url"],
+            event["description"],
+            datetime.fromisoformat(event["begin"]),
+            datetime.fromisoformat(event["end"]),
+        )
+        for event in json.loads(data)
+    ]
+
+
+concert_cache = FetchCache(
+    "concerts",
+    fetch_concert_calendar,
+    parse=parse_concert_calendar,
+    soft_ttl=6 * 60 * 60,
+    hard_ttl=2 * 24 * 60 * 60,
+    maxsize=1,
+)
 
 
 class Concerts(SimpleResponseCommand):
@@ -15,24 +74,12 @@ class Concerts(SimpleResponseCommand):
     help = "`concerts`: upcoming concerts at Yerba Buena Gardens Festival"
 
     def get_message_args(self, context: CommandContext):
-        redis = get_redis()
-        key = "concertcal"
-        ical_data = redis.get(key)
-        if ical_data is None:
-            ical_data = requests.get(
-                "https://ybgfestival.org/events/?ical=1&tribe_display=list"
-            ).content
-            redis.set(key, ical_data)
-            # Expire at midnight PST
-            redis.expireat(
-                key,
-                (arrow.utcnow().to("US/Pacific") + timedelta(days=1))
-                .replace(hour=0, minute=0)
-                .timestamp,
-            )
-
-        cal = ics.Calendar(ical_data.decode("utf-8"))
-        events = cal.timeline.start_after(arrow.utcnow() - timedelta(hours=3))
+        cutoff = datetime.now(UTC) - STARTED_WITHIN
+        events = (
+            concert
+            for concert in concert_cache.get("ybgfestival:concerts")
+            if concert.begin > cutoff
+        )
         colors = ["#7aff33", "#33a2ff"]
         return {
             "text": "Upcoming concerts at <https://ybgfestival.org/|"
@@ -1,10 +1,12 @@
 from pprint import pformat
 
+from meowbot.api import request_stats
 from meowbot.conditions import And
 from meowbot.conditions import IsCommand
 from meowbot.conditions import IsUser
 from meowbot.constants import Emoji
 from meowbot.context import CommandContext
+from meowbot.fetchcache import fetch_caches
 from meowbot.triggers import SimpleResponseCommand
 from meowbot.util import get_admin_user_id
 from meowbot.util import get_queue
@@ -45,8 +47,52 @@ class Redis(SimpleResponseCommand):
         return {"text": f"Ran `{func_name}({arg_names})`\nReturned `{ret}`"}
 
 
+class SlackStats(SimpleResponseCommand):
+    private = True
+    condition = And(IsCommand(["slackstats"]), IsUser([get_admin_user_id()]))
+
+    def get_message_args(self, context: CommandContext):
+        stats = request_stats.snapshot()
+        if not stats:
+            return {"text": "No Slack API calls made by this worker yet"}
+        lines = [f"{'method':<24}{'calls':>8}{'errors':>8}{'avg ms':>9}{'max ms':>9}"]
+        for name, method_stats in sorted(stats.items()):
+            calls = method_stats["calls"]
+            avg_ms = method_stats["total"] / calls * 1000
+            max_ms = method_stats["max"] * 1000
+            lines.append(
+                f"{name.lower():<24}{calls:>8}{method_stats['errors']:>8}"
+                f"{avg_ms:>9.1f}{max_ms:>9.1f}"
+            )
+        return {"text": "```" + "\n".join(lines) + "```"}
+
+
+class CacheStats(SimpleResponseCommand):
+    private = True
+    condition = And(IsCommand(["cachestats"]), IsUser([get_admin_user_id()]))
+
+    def get_message_args(self, context: CommandContext):
+        columns = [
+            "local_hit",
+            "redis_hit",
+            "stale",
+            "miss",
+            "stale_if_error",
+            "prewarm",
+        ]
+        lines = [f"{'cache':<12}" + "".join(f"{column:>16}" for column in columns)]
+        for name, cache in sorted(fetch_caches.items()):
+            stats = cache.stats()
+            lines.append(
+                f"{name:<12}"
+                + "".join(f"{stats.get(column, 0):>16}" for column in columns)
+            )
+        return {"text": "```" + "\n".join(lines) + "```"}
+
+
 class FailedQueue(SimpleResponseCommand):
     private = True
+    ordered = True
     condition = And(IsCommand(["failedqueue"]), IsUser([get_admin_user_id()]))
 
     def get_message_args(self, context: CommandContext):
@@ -3,9 +3,12 @@ from flask import url_for
 import meowbot
 from meowbot.conditions import IsCommand
 from meowbot.context import CommandContext
-from meowbot.triggers import BaseCommand
+from meowbot.triggers import get_command_catalog
 from meowbot.triggers import SimpleResponseCommand
-from meowbot.triggers import trigger_registry
+
+
+def _help_text(entry):
+    return entry["help"] or "no help available"
 
 
 class Help(SimpleResponseCommand):
@@ -13,35 +16,33 @@ class Help(SimpleResponseCommand):
     help = "`help`: shows all commands, or help for a particular command"
 
     def get_message_args(self, context: CommandContext):
+        # Read from the catalog so that help doesn't import every plugin
+        catalog = [
+            entry
+            for entry in get_command_catalog()
+            if entry["command"] and not entry["private"]
+        ]
         if context.args:
             name = context.args[0].lower()
-            for trigger in trigger_registry:
-                if (
-                    issubclass(trigger, BaseCommand)
-                    and not getattr(trigger, "private", False)
-                    and (name in trigger.condition._aliases)
-                ):
-                    text = trigger().get_help(context)
-                    return {"text": text}
+            for entry in catalog:
+                if name in entry["aliases"]:
+                    return {"text": _help_text(entry)}
             else:
                 text = f"`{name}` is not a valid command"
                 return {"text": text}
 
         else:
             commands = {
-                trigger.condition._name: trigger
-                for trigger in trigger_registry
-                if issubclass(trigger, BaseCommand)
-                and isinstance(trigger.condition, IsCommand)
-                and not getattr(trigger, "private", False)
+                entry["listed_name"]: entry
+                for entry in catalog
+                if entry["listed_name"] is not None
             }
 
             attachment = {
                 "pretext": "Available commands are:",
                 "fallback": ", ".join(sorted(commands)),
                 "fields": [
-                    {"value": commands[name]().get_help(context)}
-                    for name in sorted(commands)
+                    {"value": _help_text(commands[name])} for name in sorted(commands)
                 ],
                 "footer": "<{}|meowbot {}> | For more help, join "
                 "#meowbot_control".format(
@@ -59,9 +59,16 @@ class Yubi(BaseTrigger):
 class MeowbotMentioned(Condition):
     def __init__(self, suffix=""):
         self._suffix = suffix
+        # Cheap superset of the checks below, scanned together with other patterns
+        self._prefilter = RegexMatch(
+            rf"(?:meowbo[ti]|<@\w+>){re.escape(suffix)}", re.IGNORECASE
+        )
+
+    def summary(self):
+        return self._prefilter.summary()
 
     def evaluate(self, context: CommandContext):
-        if context.event.text is None:
+        if not self._prefilter.evaluate(context):
             return False
         lower_text = context.event.text.lower()
         return (
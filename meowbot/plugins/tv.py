@@ -1,16 +1,18 @@
 from flask import url_for
 
+from meowbot.channels import get_channel_directory
 from meowbot.conditions import And
 from meowbot.conditions import IsCommand
 from meowbot.conditions import IsUser
 from meowbot.constants import Emoji
 from meowbot.context import CommandContext
 from meowbot.triggers import SimpleResponseCommand
+from meowbot.tvstate import refresh
+from meowbot.tvstate import restore_default_channel
+from meowbot.tvstate import set_channel
 from meowbot.util import get_admin_user_id
-from meowbot.util import get_channels
 from meowbot.util import get_redis
 from meowbot.util import quote_user_id
-from meowbot.util import restore_default_tv_channel
 
 
 class ListChannels(SimpleResponseCommand):
@@ -18,22 +20,7 @@ class ListChannels(SimpleResponseCommand):
     help = "`listchannels`: show available Meowbot TV channels"
 
     def get_message_args(self, context: CommandContext):
-        channels = get_channels()
-        channel_aliases = sorted(channels.keys())
-        extra_channels = [
-            {"title": "youtube <video_id>", "value": f"{Emoji.YOUTUBE} Youtube video"},
-            {"title": "twitch <username>", "value": f"{Emoji.TWITCH} Twitch stream"},
-            {"title": "url <url>", "value": f"{Emoji.IE} Specified website"},
-        ]
-        attachment = {
-            "pretext": "Available channels:",
-            "fallback": ", ".join(channel_aliases),
-            "fields": [
-                {"title": alias, "value": channels[alias]["name"]}
-                for alias in channel_aliases
-            ]
-            + extra_channels,
-        }
+        attachment = get_channel_directory().attachment
         return {"attachments": [attachment], "thread_ts": context.event.ts}
 
 
@@ -52,8 +39,8 @@ class SetChannel(SimpleResponseCommand):
                 )
             }
 
-        channels = get_channels()
-        available_channels = ", ".join(sorted(channels.keys()))
+        channels = get_channel_directory()
+        available_channels = channels.available
         if len(context.args) == 1:
             (channel,) = context.args
             if channel not in channels:
@@ -62,8 +49,7 @@ class SetChannel(SimpleResponseCommand):
                     f"Available channels: {available_channels}",
                     "thread_ts": context.event.ts,
                 }
-            redis.incr("tvid")
-            redis.set("tvchannel", channels[channel]["url"])
+            set_channel(channels[channel]["url"])
             return {
                 "text": f"Changing channel to {channels[channel]['name']}!",
             }
@@ -71,15 +57,13 @@ class SetChannel(SimpleResponseCommand):
             channel_type, value = context.args
             if channel_type == "url":
                 url = value[1:-1]
-                redis.incr("tvid")
-                redis.set("tvchannel", url)
+                set_channel(url)
                 return {
                     "text": f"Changing channel to {url}!",
                 }
             elif channel_type == "twitch":
                 url = f"https://player.twitch.tv/?channel={value}"
-                redis.incr("tvid")
-                redis.set("tvchannel", url)
+                set_channel(url)
                 return {
                     "text": f"Changing channel to {Emoji.TWITCH} {value}!",
                 }
@@ -88,8 +72,7 @@ class SetChannel(SimpleResponseCommand):
                     f"https://www.youtube.com/embed/{value}?"
                     f"autoplay=1&loop=1&playlist={value}"
                 )
-                redis.incr("tvid")
-                redis.set("tvchannel", url)
+                set_channel(url)
                 return {
                     "text": f"Changing channel to {Emoji.YOUTUBE} {value}!",
                 }
@@ -113,7 +96,7 @@ class RefreshTV(SimpleResponseCommand):
     help = "`refreshtv`: refresh Meowbot TV"
 
     def get_message_args(self, context: CommandContext):
-        get_redis().incr("tvid")
+        refresh()
         return {"text": "Refreshed tv!"}
 
 
@@ -125,7 +108,7 @@ class KillTV(SimpleResponseCommand):
     def get_message_args(self, context: CommandContext):
         redis = get_redis()
         redis.set("killtv", "1")
-        restore_default_tv_channel()
+        restore_default_channel()
         admin_user_id = get_admin_user_id()
         return {
             "text": (
@@ -1,4 +1,4 @@
-import json
+import re
 
 import arrow
 import requests
@@ -6,6 +6,7 @@ import requests
 from meowbot.conditions import IsCommand
 from meowbot.constants import Emoji
 from meowbot.context import CommandContext
+from meowbot.fetchcache import FetchCache
 from meowbot.triggers import BaseCommand
 from meowbot.triggers import InteractiveCommand
 from meowbot.triggers import SimpleResponseCommand
@@ -17,6 +18,67 @@ from meowbot.util import get_redis
 USER_UNITS = "user_units"
 USER_LOCATION = "user_location"
 DEFAULT_UNITS = "us"
+# Forecasts are fetched in these units and converted as they're shown
+FORECAST_UNITS = "us"
+# Locations are rounded to this many decimal places (about 1 km) so nearby
+# queries share a forecast
+FORECAST_PRECISION = 2
+
+
+# Units in Dark Sky's summaries
+SUMMARY_TEMPERATURE = re.compile(r"(-?\d+(?:\.\d+)?)°F")
+SUMMARY_INCHES = re.compile(r"(\d+(?:\.\d+)?)(?:([–-])(\d+(?:\.\d+)?))? in\.")
+
+
+def fetch_forecast(cell):
+    api_key = get_darksky_api_key()
+    response = requests.get(
+        f"https://api.darksky.net/forecast/{api_key}/{cell}",
+        params={
+            "exclude": "minutely,alerts,flags",
+            "lang": "en",
+            "units": FORECAST_UNITS,
+        },
+        timeout=10,
+    )
+    response.raise_for_status()
+    return response.content
+
+
+def forecast_cell(location):
+    lat = round(float(location["lat"]), FORECAST_PRECISION)
+    lon = round(float(location["lon"]), FORECAST_PRECISION)
+    return f"{lat:.{FORECAST_PRECISION}f},{lon:.{FORECAST_PRECISION}f}"
+
+
+def convert_temperature(fahrenheit, units):
+    if units == "si":
+        return (fahrenheit - 32) * 5 / 9
+    return fahrenheit
+
+
+def convert_summary(summary, units):
+    """Converts the temperatures and precipitation amounts Dark Sky writes
+    into its summaries, like "high of 75°F" or "(1–2 in. of snow)" """
+    if units != "si":
+        return summary
+
+    def centimeters(match):
+        amount = f"{round(float(match[1]) * 2.54)}"
+        if match[3] is not None:
+            amount += f"{match[2]}{round(float(match[3]) * 2.54)}"
+        return f"{amount} cm."
+
+    summary = SUMMARY_TEMPERATURE.sub(
+        lambda match: f"{round(convert_temperature(float(match[1]), units))}°C",
+        summary,
+    )
+    return SUMMARY_INCHES.sub(centimeters, summary)
+
+
+forecast_cache = FetchCache(
+    "weather", fetch_forecast, soft_ttl=5 * 60, hard_ttl=60 * 60
+)
 
 
 class Weather(SimpleResponseCommand, InteractiveCommand):
@@ -46,9 +108,6 @@ class Weather(SimpleResponseCommand, InteractiveCommand):
         payload.api.interactive_response(payload, arguments)
 
     def _weather_arguments(self, query, units):
-        key = f"weather:{units}:{query}"
-        redis = get_redis()
-        data = redis.get(key)
         location = get_location(query)
         if location is None:
             return {"text": f"Location `{query}` not found"}
@@ -67,21 +126,11 @@ class Weather(SimpleResponseCommand, InteractiveCommand):
         }
         icon_default = Emoji.EARTH_AFRICA
 
-        if data is None:
-            api_key = get_darksky_api_key()
-            lat = location["lat"]
-            lon = location["lon"]
-            data = requests.get(
-                f"https://api.darksky.net/forecast/{api_key}/{lat},{lon}",
-                params={
-                    "exclude": "minutely,alerts,flags",
-                    "lang": "en",
-                    "units": units,
-                },
-            ).content
-            redis.set(key, data, ex=5 * 60)
+        cell = forecast_cell(location)
+        result = forecast_cache.get(cell, cell)
 
-        result = json.loads(data.decode("utf-8"))
+        def temperature(fahrenheit):
+            return round(convert_temperature(fahrenheit, units))
 
         temp_symbol = "℉" if units == "us" else "℃"
         other_symbol = "℃" if units == "us" else "℉"
@@ -127,11 +176,13 @@ class Weather(SimpleResponseCommand, InteractiveCommand):
                         "type": "mrkdwn",
                         "text": "*Current Weather*\n{summary}\n"
                         "{icon} {current_temperature}{temp_unit}\n".format(
-                            summary=result["hourly"]["summary"],
+                            summary=convert_summary(result["hourly"]["summary"], units),
                             icon=icon_map.get(
                                 result["currently"]["icon"], icon_default
                             ),
-                            current_temperature=int(result["currently"]["temperature"]),
+                            current_temperature=temperature(
+                                result["currently"]["temperature"]
+                            ),
                             temp_unit=temp_symbol,
                         ),
                     },
@@ -148,8 +199,8 @@ class Weather(SimpleResponseCommand, InteractiveCommand):
                                 "{low}{temp_unit}".format(
                                     day=arrow.get(day["time"]).format("ddd"),
                                     icon=icon_map.get(day["icon"], icon_default),
-                                    high=int(day["temperatureHigh"]),
-                                    low=int(day["temperatureLow"]),
+                                    high=temperature(day["temperatureHigh"]),
+                                    low=temperature(day["temperatureLow"]),
                                     temp_unit=temp_symbol,
                                 )
                             ),
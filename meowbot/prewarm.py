@@ -0,0 +1,101 @@
+"""Keeps the caches behind bare `weather` and `airquality` warm.
+
+During PREWARM_HOURS a job on the periodic queue refreshes the forecast for
+every distinct location users have saved with `setlocation`, and the AirNow
+observations for the default zip code, before they would expire. Each cache
+gets at most PREWARM_DAILY_FETCHES[name] such fetches per day. The PurpleAir
+snapshot has its own ingestion job.
+"""
+
+from datetime import datetime
+from zoneinfo import ZoneInfo
+
+import meowbot
+from instance.config import PREWARM_DAILY_FETCHES
+from instance.config import PREWARM_HOURS
+from instance.config import PREWARM_TIMEZONE
+from meowbot.plugins.airquality import airnow_cache
+from meowbot.plugins.weather import forecast_cache
+from meowbot.plugins.weather import forecast_cell
+from meowbot.plugins.weather import USER_LOCATION
+from meowbot.util import get_default_zip_code
+from meowbot.util import get_location
+from meowbot.util import get_redis
+
+# Twice the job's interval in meowbot.periodic, so an entry is refreshed at
+# least one run before it expires
+PREWARM_LEAD = 20 * 60
+
+
+def is_active(now: datetime) -> bool:
+    start, end = PREWARM_HOURS
+    if start <= end:
+        return start <= now.hour < end
+    return now.hour >= start or now.hour < end
+
+
+def saved_forecast_cells() -> set[str]:
+    """Distinct forecast cells of the locations users have saved"""
+    cells = set()
+    for _, query in get_redis().hscan_iter(USER_LOCATION):
+        try:
+            location = get_location(query.decode("utf-8"))
+        except Exception:
+            meowbot.log.exception(f"Geocoding {query} to prewarm failed")
+            continue
+        if location is not None:
+            cells.add(forecast_cell(location))
+    return cells
+
+
+class DailyQuota:
+    def __init__(self, name: str, limit: int, today):
+        self.limit = limit
+        self.key = f"prewarm:fetches:{name}:{today.isoformat()}"
+        used = get_redis().get(self.key)
+        self.used = 0 if used is None else int(used)
+
+    def __bool__(self):
+        return self.used < self.limit
+
+    def spend(self):
+        pipeline = get_redis().pipeline()
+        pipeline.incr(self.key)
+        pipeline.expire(self.key, 2 * 24 * 60 * 60)
+        self.used = pipeline.execute()[0]
+
+
+def prewarm(cache, keys_args, today):
+    """Prewarms `cache` for each (key, args) pair until its quota runs out.
+    Returns the number of fetches made."""
+    quota = DailyQuota(cache.name, PREWARM_DAILY_FETCHES.get(cache.name, 0), today)
+    fetches = 0
+    for key, args in keys_args:
+        if not quota:
+            meowbot.log.warning(f"Daily prewarm quota for {cache.name} used up")
+            break
+        try:
+            fetched = cache.prewarm(key, *args, lead=PREWARM_LEAD)
+        except Exception:
+            meowbot.log.exception(f"Prewarming {cache.name} {key} failed")
+            continue
+        if fetched:
+            quota.spend()
+            fetches += 1
+    return fetches
+
+
+def prewarm_caches():
+    now = datetime.now(ZoneInfo(PREWARM_TIMEZONE))
+    if not is_active(now):
+        return {}
+    today = now.date()
+    zip_code = get_default_zip_code()
+    return {
+        "weather": prewarm(
+            forecast_cache,
+            [(cell, (cell,)) for cell in sorted(saved_forecast_cells())],
+            today,
+        ),
+        "aqi": prewarm(airnow_cache, [(zip_code, (zip_code,))], today),
+    }
@@ -0,0 +1,364 @@
+"""PurpleAir sensor snapshots, nearest-sensor lookups and area summaries.
+
+A scheduled job streams PurpleAir's global sensor dump, keeps the outdoor
+sensors seen recently, merges each dual-laser sensor's two channels and
+stores the result in Redis as sorted columns. Commands load that snapshot
+once per ingestion and never wait on the download.
+
+Sensors are sorted by latitude so a query only looks at the band of sensors
+within its radius north and south, filters that band by haversine distance,
+and computes the exact geodesic distance for just the few closest. AQI is
+computed for every sensor at once when the snapshot is built.
+"""
+
+import io
+import json
+import math
+import time
+from collections.abc import Iterable
+from typing import NamedTuple
+
+import numpy as np
+import requests
+from geopy.distance import distance
+
+import meowbot
+from meowbot.periodic import PERIODIC_QUEUE
+from meowbot.streaming import CHUNK_SIZE
+from meowbot.streaming import iter_json_array
+from meowbot.util import get_queue
+from meowbot.util import get_redis
+
+PURPLEAIR_DATA_URL = "https://www.purpleair.com/json"
+# Hash with the snapshot's numeric `columns` (an .npz file), `labels` (a JSON
+# list) and the time it was `ingested_at`
+SNAPSHOT_KEY = "purpleair:snapshot"
+# Snapshots older than this are dropped rather than served
+SNAPSHOT_TTL = 60 * 60
+INGEST_INTERVAL = 5 * 60
+INGEST_JOB = "meowbot.purpleair.ingest_sensors"
+
+EARTH_RADIUS_MILES = 3958.8
+# Haversine assumes a sphere, so it can be off from the geodesic distance by
+# up to about 0.5%. Candidates within this much extra radius are kept.
+HAVERSINE_SLACK = 1.01
+# Closest candidates by haversine distance to check exactly, beyond the
+# number of sensors asked for
+EXTRA_CANDIDATES = 5
+# Sensors not heard from for longer than this many minutes are skipped
+MAX_AGE_MINUTES = 30
+# Rows and columns of cells in an AQI grid
+GRID_CELLS = 7
+
+# https://docs.airnowapi.org/aq101
+# https://www.airnow.gov/sites/default/files/2018-05/aqi-technical-assistance-document-may2016.pdf
+BANDS = [
+    {
+        "pm25": (0.0, 12.0),
+        "aqi": (0, 50),
+        "color": "#00e400",  # Good - Green
+        "name": "Good",
+        "emoji": ":large_green_square:",
+    },
+    {
+        "pm25": (12.1, 35.4),
+        "aqi": (51, 100),
+        "color": "#ffff00",  # Moderate - Yellow
+        "name": "Moderate",
+        "emoji": ":large_yellow_square:",
+    },
+    {
+        "pm25": (35.5, 55.4),
+        "aqi": (101, 150),
+        "color": "#ff7e00",  # USG - Orange
+        "name": "Unhealthy for Sensitive Groups",
+        "emoji": ":large_orange_square:",
+    },
+    {
+        "pm25": (55.5, 150.4),
+        "aqi": (151, 200),
+        "color": "#ff0000",  # Unhealthy - Red,
+        "name": "Unhealthy",
+        "emoji": ":large_red_square:",
+    },
+    {
+        "pm25": (150.5, 250.4),
+        "aqi": (201, 300),
+        "color": "#99004c",  # Very Unhealthy - Purple
+        "name": "Very Unhealthy",
+        "emoji": ":large_purple_square:",
+    },
+    {
+        "pm25": (250.5, 500.4),
+        "aqi": (301, 500),
+        "color": "#7e0023",  # Hazardous - Maroon,
+        "name": "Hazardous",
+        "emoji": ":large_brown_square:",
+    },
+]
+_PM25_BREAKPOINTS = np.array([band["pm25"] for band in BANDS], dtype=np.float64)
+_AQI_BREAKPOINTS = np.array([band["aqi"] for band in BANDS], dtype=np.float64)
+
+
+def pm25_to_aqi(pm25):
+    """Converts PM2.5 concentrations to AQI values and BANDS indexes.
+
+    Concentrations past the last band are extrapolated along it.
+    """
+    pm25 = np.asarray(pm25, dtype=np.float64)
+    band = np.minimum(np.searchsorted(_PM25_BREAKPOINTS[:, 1], pm25), len(BANDS) - 1)
+    lower_pm, upper_pm = _PM25_BREAKPOINTS[band].T
+    lower_aqi, upper_aqi = _AQI_BREAKPOINTS[band].T
+    # https://en.wikipedia.org/wiki/Air_quality_index#Computing_the_AQI
+    aqi = (upper_aqi - lower_aqi) / (upper_pm - lower_pm) * (
+        pm25 - lower_pm
+    ) + lower_aqi
+    return aqi, band
+
+
+def aqi_band(aqi):
+    """Returns the BANDS index an AQI value falls in"""
+    return min(int(np.searchsorted(_AQI_BREAKPOINTS[:, 1], aqi)), len(BANDS) - 1)
+
+
+class Sensor(NamedTuple):
+    label: str
+    lat: float
+    lon: float
+    # PM2.5 10 minute average in µg/m³, averaged over both channels if present
+    pm25: float
+    flagged: bool
+    last_seen: int
+    aqi: float
+    # Index into BANDS
+    band: int
+
+
+class SensorIndex:
+    def __init__(self, columns: dict[str, np.ndarray], labels: list[str], ingested_at):
+        # Every column is sorted by latitude
+        self.lats = columns["lat"]
+        self.lons = columns["lon"]
+        self.pm25 = columns["pm25"]
+        self.flagged = columns["flagged"]
+        self.last_seen = columns["last_seen"]
+        if "aqi" in columns:
+            self.aqi = columns["aqi"]
+            self.band = columns["band"]
+        else:
+            aqi, band = pm25_to_aqi(self.pm25)
+            self.aqi = aqi.astype(np.float32)
+            self.band = band.astype(np.int8)
+        self.labels = labels
+        self.ingested_at = ingested_at
+        self._lat_radians = np.radians(self.lats)
+        self._lon_radians = np.radians(self.lons)
+
+    @classmethod
+    def from_results(cls, results: Iterable[dict], ingested_at=None):
+        """Builds an index from PurpleAir results, which are read only once
+        and kept only as far as the index needs them"""
+        # Sensor ID -> (PM2.5, flagged) of the sensor's second channel
+        child_channels = {}
+        sensors = []
+        for point in results:
+            if "ParentID" in point and "Stats" in point:
+                child_channels[point["ParentID"]] = (
+                    json.loads(point["Stats"])["v1"],
+                    "Flag" in point,
+                )
+            if not (
+                point.get("DEVICE_LOCATIONTYPE") == "outside"
+                and "Lat" in point
+                and "Lon" in point
+                and "Stats" in point
+                and point["AGE"] <= MAX_AGE_MINUTES
+            ):
+                continue
+            sensor = Sensor(
+                point["Label"],
+                point["Lat"],
+                point["Lon"],
+                json.loads(point["Stats"])["v1"],
+                "Flag" in point,
+                point["LastSeen"],
+                None,
+                None,
+            )
+            sensors.append((point["ID"], sensor))
+
+        for i, (sensor_id, sensor) in enumerate(sensors):
+            child_channel = child_channels.get(sensor_id)
+            if child_channel:
+                pm25, flagged = child_channel
+                sensor = sensor._replace(
+                    pm25=(sensor.pm25 + pm25) / 2, flagged=sensor.flagged or flagged
+                )
+            sensors[i] = sensor
+        sensors.sort(key=lambda sensor: sensor.lat)
+
+        columns = {
+            "lat": np.array([s.lat for s in sensors], dtype=np.float64),
+            "lon": np.array([s.lon for s in sensors], dtype=np.float64),
+            "pm25": np.array([s.pm25 for s in sensors], dtype=np.float32),
+            "flagged": np.array([s.flagged for s in sensors], dtype=np.bool_),
+            "last_seen": np.array([s.last_seen for s in sensors], dtype=np.int64),
+        }
+        labels = [sensor.label for sensor in sensors]
+        return cls(columns, labels, ingested_at or time.time())
+
+    def to_redis(self) -> dict:
+        buffer = io.BytesIO()
+        np.savez(
+            buffer,
+            lat=self.lats,
+            lon=self.lons,
+            pm25=self.pm25,
+            flagged=self.flagged,
+            last_seen=self.last_seen,
+            aqi=self.aqi,
+            band=self.band,
+        )
+        return {
+            "columns": buffer.getvalue(),
+            "labels": json.dumps(self.labels),
+            "ingested_at": self.ingested_at,
+        }
+
+    @classmethod
+    def from_redis(cls, columns: bytes, labels: bytes, ingested_at: bytes):
+        with np.load(io.BytesIO(columns), allow_pickle=False) as npz:
+            arrays = {name: npz[name] for name in npz.files}
+        return cls(arrays, json.loads(labels), float(ingested_at))
+
+    def __len__(self):
+        return len(self.labels)
+
+    def sensor(self, i: int) -> Sensor:
+        return Sensor(
+            self.labels[i],
+            float(self.lats[i]),
+            float(self.lons[i]),
+            float(self.pm25[i]),
+            bool(self.flagged[i]),
+            int(self.last_seen[i]),
+            float(self.aqi[i]),
+            int(self.band[i]),
+        )
+
+    def nearest(self, coords: tuple[float, float], max_miles: float, count: int):
+        """Returns up to `count` (sensor, geopy distance) pairs within
+        `max_miles` of `coords`, closest first"""
+        within, miles = self._within(coords, max_miles * HAVERSINE_SLACK)
+        keep = count + EXTRA_CANDIDATES
+        if len(within) > keep:
+            within = within[np.argpartition(miles, keep)[:keep]]
+
+        candidates = []
+        for i in within:
+            sensor = self.sensor(i)
+            sensor_distance = distance((sensor.lat, sensor.lon), coords)
+            if sensor_distance.miles <= max_miles:
+                candidates.append((sensor, sensor_distance))
+        candidates.sort(key=lambda s_d: s_d[1])
+        return candidates[:count]
+
+    def area(self, coords: tuple[float, float], max_miles: float):
+        """Returns the AQI of every unflagged sensor within `max_miles` of
+        `coords`, by haversine distance"""
+        within, _ = self._within(coords, max_miles)
+        return self.aqi[within[~self.flagged[within]]]
+
+    def grid(self, coords: tuple[float, float], max_miles: float, cells=GRID_CELLS):
+        """Returns the median AQI of the unflagged sensors in each cell of a
+        `cells` by `cells` grid spanning `max_miles` around `coords`, north
+        row first. Cells without sensors are NaN."""
+        lat, lon = coords
+        half_lat = math.degrees(max_miles / EARTH_RADIUS_MILES)
+        half_lon = half_lat / max(math.cos(math.radians(lat)), 0.01)
+        start, stop = np.searchsorted(self.lats, [lat - half_lat, lat + half_lat])
+        lats = self.lats[start:stop]
+        # Wrapped so a grid can span the antimeridian
+        d_lon = (self.lons[start:stop] - lon + 180) % 360 - 180
+        rows = ((lat + half_lat - lats) / (2 * half_lat) * cells).astype(np.int64)
+        cols = np.floor((d_lon + half_lon) / (2 * half_lon) * cells).astype(np.int64)
+        keep = (rows < cells) & (cols >= 0) & (cols < cells) & ~self.flagged[start:stop]
+        cell_ids = rows[keep] * cells + cols[keep]
+        aqi = self.aqi[start:stop][keep]
+
+        # Sorted by cell, then AQI, so each cell's median is in the middle of
+        # its run
+        order = np.lexsort((aqi, cell_ids))
+        cell_ids, aqi = cell_ids[order], aqi[order]
+        ids, starts, counts = np.unique(cell_ids, return_index=True, return_counts=True)
+        medians = (aqi[starts + (counts - 1) // 2] + aqi[starts + counts // 2]) / 2
+
+        grid = np.full(cells * cells, np.nan)
+        grid[ids] = medians
+        return grid.reshape(cells, cells)
+
+    def _within(self, coords, max_miles):
+        """Returns the indexes of the sensors within `max_miles` of `coords`
+        by haversine distance, and their distances"""
+        lat, lon = coords
+        band_degrees = math.degrees(max_miles / EARTH_RADIUS_MILES)
+        start, stop = np.searchsorted(
+            self.lats, [lat - band_degrees, lat + band_degrees + 1e-9]
+        )
+        lat_radians = math.radians(lat)
+        d_lat = self._lat_radians[start:stop] - lat_radians
+        d_lon = self._lon_radians[start:stop] - math.radians(lon)
+        a = (
+            np.sin(d_lat / 2) ** 2
+            + np.cos(lat_radians)
+            * np.cos(self._lat_radians[start:stop])
+            * np.sin(d_lon / 2) ** 2
+        )
+        miles = 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+        (within,) = np.nonzero(miles <= max_miles)
+        return start + within, miles[within]
+
+
+def ingest_sensors():
+    """Downloads PurpleAir's sensor dump and stores a fresh snapshot"""
+    with requests.get(PURPLEAIR_DATA_URL, timeout=60, stream=True) as response:
+        response.raise_for_status()
+        results = iter_json_array(response.iter_content(CHUNK_SIZE), "results")
+        index = SensorIndex.from_results(results)
+
+    pipeline = get_redis().pipeline()
+    pipeline.delete(SNAPSHOT_KEY)
+    pipeline.hset(SNAPSHOT_KEY, mapping=index.to_redis())
+    pipeline.expire(SNAPSHOT_KEY, SNAPSHOT_TTL)
+    pipeline.execute()
+    return len(index)
+
+
+_index = None
+
+
+def request_ingestion():
+    """Queues an ingestion unless one was queued within INGEST_INTERVAL"""
+    if get_redis().set(f"{SNAPSHOT_KEY}:requested", 1, nx=True, ex=INGEST_INTERVAL):
+        get_queue(PERIODIC_QUEUE).enqueue(INGEST_JOB)
+
+
+def get_sensor_index() -> SensorIndex | None:
+    """The current snapshot, the last one this process loaded if it has
+    expired, or None if there is none yet. Missing snapshots are queued for
+    ingestion rather than downloaded here."""
+    global _index
+    redis = get_redis()
+    ingested_at = redis.hget(SNAPSHOT_KEY, "ingested_at")
+    if _index is not None and ingested_at is not None:
+        if _index.ingested_at == float(ingested_at):
+            return _index
+
+    fields = redis.hmget(SNAPSHOT_KEY, "columns", "labels", "ingested_at")
+    if None in fields:
+        # Only until the scheduled job has run, or if it has stopped running
+        meowbot.log.warning("No PurpleAir snapshot, queueing ingestion")
+        request_ingestion()
+        return _index
+    _index = SensorIndex.from_redis(*fields)
+    return _index
@@ -0,0 +1,114 @@
+"""Slack Web API rate limiting shared by every worker through Redis.
+
+Each bucket is a GCRA limiter: Redis stores the time the next request is
+allowed and every caller reserves a slot, sleeping until its turn instead of
+failing. A 429's Retry-After blocks the bucket for everyone.
+"""
+
+import random
+import time
+from enum import Enum
+
+import redis
+
+import meowbot
+from instance.config import SLACK_MAX_QUEUE_SECONDS
+from meowbot.util import get_script
+
+
+class RateTier(Enum):
+    # Requests per minute, requests allowed in a burst
+    TIER_1 = (1, 1)
+    TIER_2 = (20, 3)
+    TIER_3 = (50, 5)
+    TIER_4 = (100, 10)
+    # chat.postMessage allows about one message per second per channel
+    PER_CHANNEL = (60, 3)
+
+    def __init__(self, per_minute: int, burst: int):
+        self.interval = 60 / per_minute
+        self.burst = burst
+
+
+_RESERVE = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local interval = tonumber(ARGV[1])
+local tolerance = interval * (tonumber(ARGV[2]) - 1)
+local max_wait = tonumber(ARGV[3])
+
+local state = redis.call('HMGET', KEYS[1], 'tat', 'blocked_until')
+local blocked_until = tonumber(state[2]) or 0
+local tat = math.max(tonumber(state[1]) or 0, now, blocked_until)
+local wait = math.max(tat - tolerance, blocked_until) - now
+if wait > max_wait then
+    return {0, tostring(wait)}
+end
+
+redis.call('HSET', KEYS[1], 'tat', tostring(tat + interval))
+local ttl = math.ceil(tat + interval - now) + 60
+if redis.call('TTL', KEYS[1]) < ttl then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+return {1, tostring(wait)}
+"""
+
+_BLOCK = """
+local now = redis.call('TIME')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local blocked_until = now + tonumber(ARGV[1])
+local current = tonumber(redis.call('HGET', KEYS[1], 'blocked_until')) or 0
+if blocked_until > current then
+    redis.call('HSET', KEYS[1], 'blocked_until', tostring(blocked_until))
+end
+local ttl = math.ceil(tonumber(ARGV[1])) + 60
+if redis.call('TTL', KEYS[1]) < ttl then
+    redis.call('EXPIRE', KEYS[1], ttl)
+end
+"""
+
+
+class RateLimitError(Exception):
+    pass
+
+
+def bucket_key(method_name: str, team_id: str | None, channel: str | None = None):
+    key = f"slack:ratelimit:{team_id or 'unknown'}:{method_name.lower()}"
+    if channel is not None:
+        key += f":{channel}"
+    return key
+
+
+def reserve(key: str, tier: RateTier):
+    """Waits for a slot in the bucket at `key`.
+
+    Raises RateLimitError rather than queueing for more than
+    SLACK_MAX_QUEUE_SECONDS.
+    """
+    try:
+        granted, wait = get_script(_RESERVE)(
+            keys=[key],
+            args=[tier.interval, tier.burst, SLACK_MAX_QUEUE_SECONDS],
+        )
+    except redis.RedisError:
+        meowbot.log.warning(f"Rate limiter unavailable, not limiting {key}")
+        return
+    wait = float(wait)
+    if not granted:
+        raise RateLimitError(f"{key} is backed up for {wait:.1f}s")
+    if wait > 0:
+        # Spread out callers released at the same instant
+        time.sleep(wait + random.uniform(0, tier.interval / 10))
+
+
+def block(key: str, seconds: float):
+    """Holds every caller of the bucket at `key` for `seconds`"""
+    try:
+        get_script(_BLOCK)(keys=[key], args=[seconds])
+    except redis.RedisError:
+        meowbot.log.warning(f"Rate limiter unavailable, not blocking {key}")
+
+
+def backoff(attempt: int, base: float = 0.5, cap: float = 8.0):
+    """Full-jitter exponential backoff delay for the given retry attempt"""
+    return random.uniform(0, min(cap, base * 2**attempt))
@@ -0,0 +1,82 @@
+"""Persistent RQ worker for meowbot jobs.
+
+Unlike `rq worker`, this imports the app and every trigger once and runs jobs
+in-process instead of forking a fresh child per job. The process replaces
+itself with a fresh copy after WORKER_MAX_JOBS jobs or once its resident
+memory exceeds WORKER_MAX_RSS_MB. On startup it also schedules the periodic
+jobs in meowbot.periodic for rq-scheduler to enqueue.
+
+Usage: python -m meowbot.runner [queue ...]
+"""
+
+import argparse
+import os
+import sys
+
+from rq import Queue
+from rq import SimpleWorker
+
+import meowbot
+import meowbot.worker  # noqa: F401
+from meowbot.periodic import register_periodic_jobs
+from meowbot.triggers import load_all_plugins
+from meowbot.util import get_redis
+from meowbot.util import load_bot_access_tokens
+
+
+def get_rss_mb():
+    with open("/proc/self/statm") as fp:
+        resident_pages = int(fp.read().split()[1])
+    return resident_pages * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+
+
+class RecyclingWorker(SimpleWorker):
+    def __init__(self, *args, max_jobs=None, max_rss_mb=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_jobs = max_jobs
+        self.max_rss_mb = max_rss_mb
+        self.jobs_run = 0
+        self.should_recycle = False
+
+    def execute_job(self, job, queue):
+        super().execute_job(job, queue)
+        self.jobs_run += 1
+        if self.max_jobs and self.jobs_run >= self.max_jobs:
+            self.log.info("Recycling after %d jobs", self.jobs_run)
+            self.should_recycle = True
+        elif self.max_rss_mb and get_rss_mb() > self.max_rss_mb:
+            self.log.info("Recycling at %.0f MB resident", get_rss_mb())
+            self.should_recycle = True
+        if self.should_recycle:
+            self._stop_requested = True
+
+
+def warm_up():
+    load_all_plugins()
+    with meowbot.app.app_context():
+        load_bot_access_tokens()
+    get_redis().ping()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a persistent meowbot worker")
+    parser.add_argument("queues", nargs="*", default=["default"])
+    args = parser.parse_args()
+
+    warm_up()
+    register_periodic_jobs()
+    connection = get_redis()
+    worker = RecyclingWorker(
+        [Queue(name, connection=connection) for name in args.queues],
+        connection=connection,
+        max_jobs=meowbot.app.config.get("WORKER_MAX_JOBS"),
+        max_rss_mb=meowbot.app.config.get("WORKER_MAX_RSS_MB"),
+    )
+    worker.work()
+
+    if worker.should_recycle:
+        os.execv(sys.executable, [sys.executable, "-m", __spec__.name, *sys.argv[1:]])
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,38 @@
 var channelId;
+var pollTimer;
+
+function showChannel(data) {
+    if (channelId !== data.id) {
+        channelId = data.id;
+        $('#tvframe').attr('src', data.channel);
+    }
+}
 
 function refreshTv() {
-    $.get('/tv/channel').done(
-        function(data) {
-            if (channelId !== data.id) {
-                channelId = data.id;
-                $('#tvframe').attr('src', data.channel);
-            }
-        }
-    )
+    $.get('/tv/channel').done(showChannel);
+}
+
+function startPolling() {
+    if (pollTimer === undefined) {
+        refreshTv();
+        pollTimer = setInterval(refreshTv, 5000);
+    }
 }
 
 $(document).ready(function() {
-    refreshTv();
-    setInterval(refreshTv, 5000);
+    if (!window.EventSource) {
+        startPolling();
+        return;
+    }
+    var source = new EventSource('/tv/events');
+    source.onmessage = function(event) {
+        showChannel(JSON.parse(event.data));
+    };
+    source.onerror = function() {
+        // The browser retries dropped streams itself; it only gives up
+        // when the endpoint is unusable, so fall back to polling then
+        if (source.readyState === EventSource.CLOSED) {
+            startPolling();
+        }
+    };
 });
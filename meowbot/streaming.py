@@ -0,0 +1,186 @@
+"""Incremental parsers for large upstream payloads.
+
+Both read a response a chunk or line at a time and yield records as soon as
+they are complete, so only the current record is ever held in memory.
+"""
+
+import codecs
+import json
+import re
+from collections.abc import Iterable
+from collections.abc import Iterator
+from datetime import datetime
+from datetime import UTC
+from zoneinfo import ZoneInfo
+from zoneinfo import ZoneInfoNotFoundError
+
+CHUNK_SIZE = 64 * 1024
+# Longest a single JSON value may be, so malformed input fails fast instead of
+# being buffered to the end
+MAX_VALUE_SIZE = 1024 * 1024
+
+_decoder = json.JSONDecoder()
+_WHITESPACE = " \t\n\r"
+_DELIMITERS = _WHITESPACE + ",:]}"
+# Escaped characters in iCalendar text values
+_ESCAPE = re.compile(r"\\(.)")
+
+
+class _JsonStream:
+    def __init__(self, chunks: Iterable[bytes], max_value_size: int):
+        self.chunks = iter(chunks)
+        self.max_value_size = max_value_size
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buffer = ""
+        self.pos = 0
+        self.done = False
+
+    def read_more(self):
+        if self.done:
+            raise ValueError("Unexpected end of JSON document")
+        chunk = next(self.chunks, None)
+        if chunk is None:
+            self.done = True
+            text = self.utf8.decode(b"", final=True)
+        else:
+            text = self.utf8.decode(chunk)
+        # Everything before pos has been consumed
+        self.buffer = self.buffer[self.pos :] + text
+        self.pos = 0
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            self.read_more()
+
+    def expect(self, char: str):
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} at {self.buffer[self.pos :][:20]!r}")
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.done:
+                    raise
+            else:
+                # A number cut off by the end of the buffer can look complete,
+                # so a value only counts once what follows it has been read
+                if self.done or (
+                    end < len(self.buffer) and self.buffer[end] in _DELIMITERS
+                ):
+                    self.pos = end
+                    return value
+            if len(self.buffer) - self.pos > self.max_value_size:
+                raise ValueError(
+                    f"JSON value longer than {self.max_value_size} characters"
+                )
+            self.read_more()
+
+
+def iter_json_array(
+    chunks: Iterable[bytes], key: str, max_value_size: int = MAX_VALUE_SIZE
+) -> Iterator:
+    """Yields each element of the array at `key` in the JSON object that
+    `chunks` make up. Other values in the object are parsed and skipped.
+
+    Raises ValueError if the document is malformed, or if any value in it
+    can't be parsed within `max_value_size` characters.
+    """
+    stream = _JsonStream(chunks, max_value_size)
+    stream.expect("{")
+    if stream.peek() == "}":
+        raise KeyError(key)
+    while True:
+        name = stream.value()
+        stream.expect(":")
+        if name == key:
+            break
+        stream.value()
+        if stream.peek() == "}":
+            raise KeyError(key)
+        stream.expect(",")
+
+    stream.expect("[")
+    if stream.peek() == "]":
+        return
+    while True:
+        yield stream.value()
+        if stream.peek() == "]":
+            return
+        stream.expect(",")
+
+
+def _unfold(lines: Iterable[bytes]) -> Iterator[str]:
+    """Joins folded iCalendar content lines back together"""
+    current = None
+    for line in lines:
+        line = line.rstrip(b"\r")
+        # Blank lines aren't valid, but show up when a CRLF is split across
+        # chunks
+        if not line:
+            continue
+        if line[:1] in (b" ", b"\t"):
+            if current is not None:
+                current += line[1:]
+            continue
+        if current is not None:
+            yield current.decode("utf-8", errors="replace")
+        current = line
+    if current is not None:
+        yield current.decode("utf-8", errors="replace")
+
+
+def _unescape(text: str) -> str:
+    return _ESCAPE.sub(lambda m: "\n" if m[1] in "nN" else m[1], text)
+
+
+def _parse_time(value: str, params: dict) -> datetime:
+    if params.get("VALUE") == "DATE" or len(value) == 8:
+        return datetime.strptime(value, "%Y%m%d").replace(tzinfo=UTC)
+    if value.endswith("Z"):
+        return datetime.strptime(value, "%Y%m%dT%H%M%SZ").replace(tzinfo=UTC)
+    try:
+        tz = ZoneInfo(params["TZID"])
+    except (KeyError, ValueError, ZoneInfoNotFoundError):
+        tz = UTC
+    return datetime.strptime(value, "%Y%m%dT%H%M%S").replace(tzinfo=tz)
+
+
+def iter_ical_events(lines: Iterable[bytes]) -> Iterator[dict]:
+    """Yields each VEVENT in an iCalendar file as a dict with its `name`,
+    `url`, `description`, `begin` and `end`"""
+    event = None
+    for line in _unfold(lines):
+        head, _, value = line.partition(":")
+        prop, *param_list = head.split(";")
+        prop = prop.upper()
+        if prop == "BEGIN" and value == "VEVENT":
+            event = {"name": None, "url": None, "description": None}
+        elif prop == "END" and value == "VEVENT":
+            if event is not None and "begin" in event:
+                event.setdefault("end", event["begin"])
+                yield event
+            event = None
+        elif event is not None:
+            params = {}
+            for param in param_list:
+                param_name, _, param_value = param.partition("=")
+                params[param_name.upper()] = param_value.strip('"')
+            if prop == "SUMMARY":
+                event["name"] = _unescape(value)
+            elif prop == "DESCRIPTION":
+                event["description"] = _unescape(value)
+            elif prop == "URL":
+                event["url"] = value
+            elif prop == "DTSTART":
+                event["begin"] = _parse_time(value, params)
+            elif prop == "DTEND":
+                event["end"] = _parse_time(value, params)
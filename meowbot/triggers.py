@@ -1,17 +1,94 @@
+import heapq
 import inspect
 from abc import ABCMeta
 from abc import abstractmethod
+from bisect import insort
+from collections import defaultdict
 
-from meowbot.conditions import IsCommand
+import meowbot.plugins
+from meowbot.conditions import ActivationSummary
 from meowbot.conditions import Never
 from meowbot.context import CommandContext
 from meowbot.context import InteractivePayload
 from meowbot.context import SlackAction
+from meowbot.manifest import get_manifest
+from meowbot.manifest import import_plugin
+from meowbot.manifest import plugin_module_name
+from meowbot.util import gather
+from meowbot.util import submit
 
 trigger_registry = []
+# Triggers gated on a command, keyed by alias. Each list is sorted by priority.
+command_index = defaultdict(list)
+# Triggers that must be evaluated for every event, sorted by priority.
+generic_triggers = []
+# Interactive commands keyed by the command prefix of their action ids.
+action_router = {}
+# What any registered trigger needs to see in an event to possibly activate.
+activation_summary = ActivationSummary()
+# Plugin modules imported so far. Others are imported once they are needed.
+loaded_plugins = set()
+
+
+def load_plugins(modules):
+    for module in modules:
+        if module not in loaded_plugins:
+            import_plugin(module)
+            loaded_plugins.add(module)
+
+
+def load_all_plugins():
+    load_plugins(meowbot.plugins.__all__)
+
+
+def _load_plugins_for(context: CommandContext):
+    if len(loaded_plugins) == len(meowbot.plugins.__all__):
+        return
+    manifest = get_manifest()
+    if manifest is None:
+        load_all_plugins()
+    else:
+        load_plugins(manifest.modules_for(context, exclude=loaded_plugins))
+
+
+def get_command_catalog():
+    """Descriptions of every trigger, loaded or not (see BaseTrigger.describe)"""
+    manifest = get_manifest()
+    if manifest is None:
+        load_all_plugins()
+        return [trigger_cls.describe() for trigger_cls in trigger_registry]
+    return manifest.triggers
+
+
+def get_action_handler(command):
+    if command not in action_router:
+        manifest = get_manifest()
+        if manifest is None:
+            load_all_plugins()
+        elif command in manifest.action_modules:
+            load_plugins([manifest.action_modules[command]])
+    return action_router.get(command)
+
+
+def _dispatch_key(trigger_cls):
+    return trigger_cls._dispatch_key
+
+
+def get_candidate_triggers(context: CommandContext):
+    """Triggers that may activate for `context`, in the order they should run"""
+    _load_plugins_for(context)
+    command_triggers = command_index.get(context.command, ())
+    if not command_triggers:
+        return generic_triggers
+    return list(heapq.merge(command_triggers, generic_triggers, key=_dispatch_key))
 
 
 class BaseTrigger(metaclass=ABCMeta):
+    # Ordered triggers run on the job's thread after their concurrent peers
+    # have been started, and send their messages one at a time in the order
+    # they are generated.
+    ordered = False
+
     @property
     @classmethod
     @abstractmethod
@@ -23,10 +100,49 @@ class BaseTrigger(metaclass=ABCMeta):
         super().__init_subclass__(**kwargs)
 
         if not abstract:
-            trigger_registry.append(cls)
+            cls._register()
+
+    @classmethod
+    def _register(cls):
+        # Higher priority runs first. Ties run in the order the triggers are
+        # declared, regardless of the order their plugins were loaded in.
+        module = plugin_module_name(cls.__module__)
+        plugins = meowbot.plugins.__all__
+        cls._dispatch_key = (
+            -getattr(cls, "priority", 0),
+            plugins.index(module) if module in plugins else len(plugins),
+            len(trigger_registry),
+        )
+        cls._plan = cls.condition.compile()
+        trigger_registry.append(cls)
+        activation_summary.update(cls.condition.summary())
+
+        aliases = cls.condition.command_aliases()
+        if aliases is None:
+            insort(generic_triggers, cls, key=_dispatch_key)
+        else:
+            for alias in aliases:
+                insort(command_index[alias], cls, key=_dispatch_key)
+
+    @classmethod
+    def activated(cls, context):
+        return cls._plan.evaluate(context)
 
-    def activated(self, context):
-        return self.condition.evaluate(context)
+    @classmethod
+    def describe(cls):
+        aliases = cls.condition.command_aliases()
+        return {
+            "module": plugin_module_name(cls.__module__),
+            "name": cls.__qualname__,
+            "command": issubclass(cls, BaseCommand),
+            "interactive": issubclass(cls, InteractiveCommand),
+            "listed_name": getattr(cls.condition, "_name", None),
+            "aliases": sorted(aliases) if aliases is not None else [],
+            "help": getattr(cls, "help", None),
+            "private": getattr(cls, "private", False),
+            "priority": getattr(cls, "priority", 0),
+            "summary": cls.condition.summary().to_json(),
+        }
 
     @abstractmethod
     def run(self, context: CommandContext):
@@ -56,14 +172,21 @@ class SimpleResponseCommand(BaseCommand, abstract=True, metaclass=ABCMeta):
             else (self.get_message_args(context),)
         )
 
+        futures = []
         for arguments in arg_gen:
             arguments["channel"] = context.event.channel
             # Respond to thread if meowbot was mentioned in one
             if hasattr(context.event, "thread_ts"):
                 arguments["thread_ts"] = context.event.thread_ts
 
-            self.responses.append(context.api.chat_post_message(arguments))
+            if self.ordered:
+                self.responses.append(context.api.chat_post_message(arguments))
+            else:
+                futures.append(
+                    submit("outbound", context.api.chat_post_message, arguments)
+                )
 
+        self.responses.extend(gather(futures))
         self.post_run(context)
 
     def post_run(self, context):
@@ -73,10 +196,25 @@ class SimpleResponseCommand(BaseCommand, abstract=True, metaclass=ABCMeta):
 
 
 class InteractiveCommand(BaseCommand, abstract=True, metaclass=ABCMeta):
-    def is_action_relevant(self, action):
-        if isinstance(self.condition, IsCommand):
-            return action.command in self.condition._aliases
-        return False
+    @classmethod
+    def _register(cls):
+        aliases = cls.condition.command_aliases() or ()
+        for alias in aliases:
+            if alias in action_router:
+                raise ValueError(
+                    f"{cls.__name__} and {action_router[alias].__name__} both "
+                    f"handle {alias!r} actions"
+                )
+        super()._register()
+        for alias in aliases:
+            action_router[alias] = cls
+
+    def is_action_relevant(self, payload: InteractivePayload, action: SlackAction):
+        # The alias only picks the handler; the rest of its condition, like
+        # who may use it, still has to hold
+        return action_router.get(action.command) is type(self) and self.activated(
+            payload.command_context(action)
+        )
 
     @abstractmethod
     def interact(self, payload: InteractivePayload, action: SlackAction):
@@ -92,6 +230,3 @@ class MissingCommand(SimpleResponseCommand):
             "text": f"Meow? (I don't understand `{context.command}`). "
             "Try `@meowbot help`."
         }
-
-
-from meowbot.plugins import *  # noqa
@@ -0,0 +1,72 @@
+import json
+import time
+
+from meowbot.channels import get_channel_directory
+from meowbot.util import get_config
+from meowbot.util import get_redis
+from meowbot.util import get_script
+
+# Hash holding the TV's `channel` URL and an `id` bumped on every change so
+# screens reload even if the URL stays the same
+TV_STATE_KEY = "tv:state"
+# Pub/sub channel every change is announced on
+TV_EVENTS_CHANNEL = "tv:events"
+
+# Sets the channel (or keeps the current one if ARGV[1] is empty), bumps the id
+# and announces the new state, all in one step. Returns nil if there is no
+# channel to keep.
+_UPDATE = """
+local channel = ARGV[1]
+if channel == '' then
+    channel = redis.call('HGET', KEYS[1], 'channel')
+    if not channel then
+        return nil
+    end
+end
+local id = redis.call('HINCRBY', KEYS[1], 'id', 1)
+redis.call('HSET', KEYS[1], 'channel', channel)
+local state = cjson.encode({channel = channel, id = tostring(id)})
+redis.call('PUBLISH', ARGV[2], state)
+return state
+"""
+
+# (state, time.monotonic() it was read at) of the last read in this process
+_cached_state = None
+
+
+def _update(channel):
+    global _cached_state
+    state = get_script(_UPDATE)(keys=[TV_STATE_KEY], args=[channel, TV_EVENTS_CHANNEL])
+    _cached_state = None
+    return None if state is None else json.loads(state)
+
+
+def set_channel(url):
+    return _update(url)
+
+
+def refresh():
+    if _update("") is None:
+        restore_default_channel()
+
+
+def restore_default_channel():
+    channels = get_channel_directory()
+    default_channel = get_config()["default_tv_channel"]
+    return set_channel(channels[default_channel]["url"])
+
+
+def get_state(max_age=0):
+    """Returns the TV's channel and id, reusing a read up to `max_age` old"""
+    global _cached_state
+    now = time.monotonic()
+    if _cached_state is not None and now - _cached_state[1] < max_age:
+        return _cached_state[0]
+
+    channel, id_ = get_redis().hmget(TV_STATE_KEY, "channel", "id")
+    if channel is None:
+        state = restore_default_channel()
+    else:
+        state = {"channel": channel.decode("utf-8"), "id": id_.decode("utf-8")}
+    _cached_state = (state, now)
+    return state
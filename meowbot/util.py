@@ -1,19 +1,28 @@
 import hmac
 import json
+import os
 import time
+from concurrent.futures import Future
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import wait
+from functools import cache
 from functools import lru_cache
 from functools import wraps
 
 import redis
 import rq
-import rq_scheduler
 import yaml
 from flask import request
 from flask import Response
-from geopy import Nominatim
+from redis.exceptions import LockError
 
 import meowbot
+from instance.config import BOT_ACCESS_TOKEN_TTL
 from instance.config import REDIS_URL
+from instance.config import WORKER_FANOUT_THREADS
+from meowbot.cache import LRUCache
+from meowbot.cache import MISSING
+from meowbot.cache import SingleFlight
 from meowbot.models import AccessToken
 
 YAML_CONF_PATH = "instance/config.yaml"
@@ -61,47 +70,89 @@ def get_admin_user_id():
     return get_config()["admin_user_id"]
 
 
+# Geocoding results are kept for LOCATION_TTL seconds in Redis and
+# LOCATION_LOCAL_TTL in each process. Places Nominatim doesn't know are
+# remembered for LOCATION_MISS_TTL.
+LOCATION_TTL = 30 * 24 * 60 * 60
+LOCATION_MISS_TTL = 24 * 60 * 60
+LOCATION_LOCAL_TTL = 60 * 60
+# Nominatim requests give up well before the lock other workers wait on
+# expires
+GEOCODE_TIMEOUT = 10
+GEOCODE_LOCK_TIMEOUT = 30
+_locations = LRUCache(maxsize=1024, ttl=LOCATION_LOCAL_TTL)
+_location_lookups = SingleFlight()
+
+
+def normalize_location_query(query):
+    return " ".join(query.casefold().replace(",", " ").split())
+
+
 def get_location(query):
+    key = f"location:{normalize_location_query(query)}"
+    raw_location = _locations.get(key)
+    if raw_location is MISSING:
+        raw_location = _location_lookups.do(key, _load_location, key, query)
+    return raw_location
+
+
+def _load_location(key, query):
     redis = get_redis()
-    key = f"location:{query}"
-    if redis.exists(key):
-        raw_location = json.loads(redis.get(key).decode("utf-8"))
-    else:
-        geocoder = Nominatim(user_agent="https://github.com/pbhuss/meowbot")
-        location = geocoder.geocode(query)
-        if location is None:
-            return None
-        raw_location = location.raw
-        redis.set(key, json.dumps(raw_location), ex=30 * 24 * 60 * 60)
+    cached = redis.get(key)
+    if cached is None:
+        # Only one worker asks Nominatim; the rest wait for its answer
+        lock = redis.lock(f"{key}:lock", timeout=GEOCODE_LOCK_TIMEOUT)
+        acquired = lock.acquire(blocking_timeout=15)
+        try:
+            cached = redis.get(key)
+            if cached is None:
+                cached = _geocode(key, query)
+        finally:
+            if acquired:
+                try:
+                    lock.release()
+                except LockError:
+                    pass
+
+    raw_location = json.loads(cached)
+    _locations.set(key, raw_location)
     return raw_location
 
 
+def _geocode(key, query):
+    # Imported here to keep it out of the web app, which never geocodes
+    from geopy import Nominatim
+
+    geocoder = Nominatim(
+        user_agent="https://github.com/pbhuss/meowbot", timeout=GEOCODE_TIMEOUT
+    )
+    location = geocoder.geocode(query)
+    raw_location = None if location is None else location.raw
+    cached = json.dumps(raw_location)
+    ttl = LOCATION_TTL if location is not None else LOCATION_MISS_TTL
+    get_redis().set(key, cached, ex=ttl)
+    return cached
+
+
 @lru_cache(maxsize=1)
 def get_redis():
     return redis.StrictRedis.from_url(REDIS_URL)
 
 
-def get_queue():
-    return rq.Queue(connection=get_redis())
+@cache
+def get_script(source):
+    return get_redis().register_script(source)
 
 
-def get_scheduler():
-    return rq_scheduler.Scheduler(connection=get_redis())
+def get_queue(name="default"):
+    return rq.Queue(name, connection=get_redis())
 
 
-def get_channels():
-    with open("instance/channels.json", encoding="utf-8") as fp:
-        return json.load(fp)
-
+def get_scheduler():
+    # Imported here to keep it out of the web app, which never schedules jobs
+    import rq_scheduler
 
-def restore_default_tv_channel():
-    channels = get_channels()
-    default_channel = get_config()["default_tv_channel"]
-    url = channels[default_channel]["url"]
-    r = get_redis()
-    r.incr("tvid")
-    r.set("tvchannel", url)
-    return url
+    return rq_scheduler.Scheduler(connection=get_redis())
 
 
 def verify_signature(f):
@@ -146,19 +197,78 @@ def quote_user_id(user_id):
     return f"<@{user_id}>"
 
 
+# Hash of team id -> version, bumped whenever a team's token changes. Other
+# processes notice once their cached copy's BOT_ACCESS_TOKEN_TTL runs out.
+BOT_ACCESS_TOKEN_VERSIONS = "bot_access_token:versions"
+
+# team id -> (token, time.monotonic() it expires at, version it was read at)
+_bot_access_tokens = {}
+
+
+def _get_bot_access_token_version(team_id):
+    try:
+        version = get_redis().hget(BOT_ACCESS_TOKEN_VERSIONS, team_id)
+    except redis.RedisError:
+        meowbot.log.exception("Could not check the bot access token version")
+        return None
+    return 0 if version is None else int(version)
+
+
 def get_bot_access_token(team_id):
+    cached = _bot_access_tokens.get(team_id)
+    if cached is not None and cached[1] > time.monotonic():
+        return cached[0]
+
+    # An expired token is kept without reading the database again unless its
+    # version has changed since
+    version = _get_bot_access_token_version(team_id)
+    if cached is not None and version is not None and cached[2] == version:
+        _cache_bot_access_token(team_id, cached[0], version)
+        return cached[0]
+
     row = (
         AccessToken.query.filter_by(
             team_id=team_id,
         )
+        .order_by(AccessToken.id.desc())
         .limit(1)
         .one_or_none()
     )
     if row:
+        _cache_bot_access_token(team_id, row.bot_access_token, version)
         return row.bot_access_token
     return None
 
 
+def _cache_bot_access_token(team_id, bot_access_token, version):
+    expires_at = time.monotonic() + BOT_ACCESS_TOKEN_TTL
+    _bot_access_tokens[team_id] = (bot_access_token, expires_at, version)
+
+
+def load_bot_access_tokens():
+    versions = {
+        team_id.decode("utf-8"): int(version)
+        for team_id, version in get_redis().hgetall(BOT_ACCESS_TOKEN_VERSIONS).items()
+    }
+    # Ascending ids, so the newest token for each team wins
+    for row in AccessToken.query.order_by(AccessToken.id):
+        _cache_bot_access_token(
+            row.team_id, row.bot_access_token, versions.get(row.team_id, 0)
+        )
+
+
+def invalidate_bot_access_token(team_id=None):
+    """Drops `team_id`'s cached token so this process reads it from the
+    database on its next use, and bumps its version so other processes do
+    once their copy expires. If `team_id` is None, this process drops every
+    team's cached token instead."""
+    if team_id is None:
+        _bot_access_tokens.clear()
+        return
+    _bot_access_tokens.pop(team_id, None)
+    get_redis().hincrby(BOT_ACCESS_TOKEN_VERSIONS, team_id)
+
+
 def with_app_context(f):
     @wraps(f)
     def decorated(*args, **kwargs):
@@ -168,6 +278,40 @@ def with_app_context(f):
     return decorated
 
 
+@cache
+def _get_executor(name, pid):
+    return ThreadPoolExecutor(
+        max_workers=WORKER_FANOUT_THREADS,
+        thread_name_prefix=f"meowbot-{name}",
+    )
+
+
+def get_executor(name):
+    # Keyed by pid so a forked worker never inherits its parent's threads
+    return _get_executor(name, os.getpid())
+
+
+def submit(pool_name, f, *args, **kwargs):
+    """Runs `f` on the named thread pool, or inline if fan-out is disabled"""
+    if WORKER_FANOUT_THREADS <= 0:
+        future = Future()
+        try:
+            future.set_result(f(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+    return get_executor(pool_name).submit(with_app_context(f), *args, **kwargs)
+
+
+def gather(futures):
+    """Waits for every future, then returns their results in order.
+
+    If any failed, the first exception in submission order is raised.
+    """
+    wait(futures)
+    return [future.result() for future in futures]
+
+
 def check_auth(username, password):
     config = get_config()
     return username == config["admin_username"] and password == config["admin_password"]
@@ -1,23 +1,62 @@
 import json
-from itertools import groupby
+import math
+import time
+import uuid
 
 import requests
+from flask import abort
 from flask import Blueprint
 from flask import jsonify
 from flask import render_template
 from flask import request
 from flask import Response
+from flask import stream_template
 
 import meowbot
+from meowbot.catalog import get_catalog
+from meowbot.context import CommandContext
+from meowbot.context import InteractivePayload
+from meowbot.manifest import get_manifest
 from meowbot.models import AccessToken
-from meowbot.models import Cat
+from meowbot.tvstate import get_state
+from meowbot.tvstate import TV_EVENTS_CHANNEL
 from meowbot.util import get_config
 from meowbot.util import get_queue
 from meowbot.util import get_redis
-from meowbot.util import restore_default_tv_channel
+from meowbot.util import get_script
+from meowbot.util import invalidate_bot_access_token
 from meowbot.util import verify_signature
-from meowbot.worker import process_interactive
-from meowbot.worker import process_request
+
+# Jobs are enqueued by path so the web app never imports the trigger system
+PROCESS_REQUEST_JOB = "meowbot.worker.process_request"
+PROCESS_INTERACTIVE_JOB = "meowbot.worker.process_interactive"
+
+CATS_PER_PAGE = 30
+
+# /tv/events streams end after TV_STREAM_SECONDS so each TV reconnects and no
+# server thread is held forever, with comments sent to keep proxies from
+# timing out while the channel is idle
+TV_STREAM_SECONDS = 600
+TV_KEEPALIVE_SECONDS = 20
+TV_RECONNECT_MS = 3000
+# Seconds each process may reuse a read of the TV state for /tv/channel polls
+TV_STATE_MAX_AGE = 1
+# Streams share uwsgi's threads with Slack events, so only this many may be
+# open at once (see instance/meowbot.ini). Screens over the limit poll instead.
+TV_MAX_STREAMS = 16
+# Sorted set of open streams, scored by when they end at the latest so slots
+# of processes that died are reclaimed
+TV_STREAMS_KEY = "tv:streams"
+# Frees expired slots, then takes one if any are left
+_TAKE_STREAM_SLOT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[3]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[4])
+redis.call('EXPIRE', KEYS[1], ARGV[5])
+return 1
+"""
 
 main = Blueprint("main", __name__)
 
@@ -27,6 +66,16 @@ def index():
     return render_template("index.html", version=meowbot.__version__)
 
 
+def _admits(manifest, data) -> bool:
+    # Events the prefilter can't parse are left for the worker to handle, so
+    # Slack still gets its ack instead of a 500 and a retry
+    try:
+        return manifest.summary.admits(CommandContext(data))
+    except Exception:
+        meowbot.log.exception("Could not prefilter event, enqueueing it")
+        return True
+
+
 @main.route("/meow", methods=["POST"])
 @verify_signature
 def meow():
@@ -37,7 +86,14 @@ def meow():
     if data["type"] == "url_verification":
         return jsonify({"challenge": data["challenge"]})
 
-    get_queue().enqueue(process_request, data=data)
+    if "event" not in data:
+        return Response(status=200)
+    # Acknowledge events that no trigger could act on without enqueueing them
+    manifest = get_manifest()
+    if manifest is not None and not _admits(manifest, data):
+        return Response(status=200)
+
+    get_queue().enqueue(PROCESS_REQUEST_JOB, data=data)
 
     return Response(status=200)
 
@@ -48,7 +104,14 @@ def interactive():
     data = request.values.get("payload", type=json.loads)
     meowbot.log.debug(data)
 
-    get_queue().enqueue(process_interactive, data=data)
+    manifest = get_manifest()
+    if manifest is not None and not any(
+        action.command in manifest.action_modules
+        for action in InteractivePayload(data).actions
+    ):
+        return Response(status=200)
+
+    get_queue().enqueue(PROCESS_INTERACTIVE_JOB, data=data)
 
     return Response(status=200)
 
@@ -77,6 +140,7 @@ def authorize():
         )
         meowbot.db.session.add(row)
         meowbot.db.session.commit()
+        invalidate_bot_access_token(row.team_id)
         return "Success!"
     else:
         meowbot.log.error(r.text)
@@ -85,19 +149,81 @@ def authorize():
 
 @main.route("/cats")
 def cats():
-    cats = Cat.query.order_by(Cat.name).all()
-    grouped_cats = groupby(cats, lambda cat: cat.name)
-    return render_template("cats.html", cats=grouped_cats, enumerate=enumerate)
+    catalog = get_catalog()
+    name = request.args.get("name", type=str.lower)
+    page = request.args.get("page", 1, type=int)
+
+    entries = catalog.entries(name)
+    num_pages = max(1, math.ceil(len(entries) / CATS_PER_PAGE))
+    if (name is not None and not entries) or not 1 <= page <= num_pages:
+        abort(404)
+
+    start = (page - 1) * CATS_PER_PAGE
+    response = Response(
+        stream_template(
+            "cats.html",
+            names=catalog.names,
+            name=name,
+            entries=entries[start : start + CATS_PER_PAGE],
+            page=page,
+            num_pages=num_pages,
+        )
+    )
+    # Every page is rebuilt from the catalog, so its version identifies it
+    response.set_etag(f"{meowbot.__version__}-{catalog.version}")
+    if catalog.updated is not None:
+        response.last_modified = catalog.updated
+    response.cache_control.no_cache = True
+    # The body is only rendered if the client's copy turns out to be stale
+    return response.make_conditional(request)
 
 
 @main.route("/tv/channel")
 def tv_channel():
-    redis = get_redis()
-    channel = redis.get("tvchannel").decode("utf-8")
-    id_ = redis.get("tvid").decode("utf-8") or 0
-    if channel is None:
-        channel = restore_default_tv_channel()
-    return jsonify(channel=channel, id=id_)
+    state = get_state(max_age=TV_STATE_MAX_AGE)
+    response = jsonify(**state)
+    response.add_etag()
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+@main.route("/tv/events")
+def tv_events():
+    slot = uuid.uuid4().hex
+    now = time.time()
+    # Allow for the keepalive wait that can run past the deadline
+    expires_at = now + TV_STREAM_SECONDS + TV_KEEPALIVE_SECONDS
+    taken = get_script(_TAKE_STREAM_SLOT)(
+        keys=[TV_STREAMS_KEY],
+        args=[now, expires_at, TV_MAX_STREAMS, slot, math.ceil(expires_at - now)],
+    )
+    if not taken:
+        return Response(
+            "Too many TV streams", status=503, headers={"Retry-After": "60"}
+        )
+
+    def stream():
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        # Subscribe before reading the state so no change can slip between
+        pubsub.subscribe(TV_EVENTS_CHANNEL)
+        try:
+            yield f"retry: {TV_RECONNECT_MS}\ndata: {json.dumps(get_state())}\n\n"
+            deadline = time.monotonic() + TV_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                message = pubsub.get_message(timeout=TV_KEEPALIVE_SECONDS)
+                if message is None:
+                    yield ": keepalive\n\n"
+                else:
+                    yield f"data: {message['data'].decode('utf-8')}\n\n"
+        finally:
+            pubsub.close()
+            get_redis().zrem(TV_STREAMS_KEY, slot)
+
+    return Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @main.route("/tv")
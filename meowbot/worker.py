@@ -1,7 +1,13 @@
+from concurrent.futures import wait
+from itertools import groupby
+
+import meowbot
 from meowbot.context import CommandContext
 from meowbot.context import InteractivePayload
-from meowbot.triggers import InteractiveCommand
-from meowbot.triggers import trigger_registry
+from meowbot.triggers import get_action_handler
+from meowbot.triggers import get_candidate_triggers
+from meowbot.util import gather
+from meowbot.util import submit
 from meowbot.util import with_app_context
 
 
@@ -9,29 +15,53 @@ from meowbot.util import with_app_context
 def process_request(data):
     context = CommandContext(data)
 
-    activated_triggers = []
-    for trigger_cls in trigger_registry:
-        trigger = trigger_cls()
-        if trigger.activated(context):
-            activated_triggers.append(trigger)
+    activated_triggers = [
+        trigger_cls()
+        for trigger_cls in get_candidate_triggers(context)
+        if trigger_cls.activated(context)
+    ]
+
+    if activated_triggers:
+        # Look up the token once instead of racing to do so in every thread
+        context.api
 
-    for trigger in sorted(
-        activated_triggers, key=lambda t: getattr(t, "priority", 0), reverse=True
-    ):
-        trigger.run(context)
+    # Triggers of equal priority run concurrently, except those that declare
+    # themselves ordered, which run one after another on this thread.
+    for _, tier in groupby(activated_triggers, key=_priority):
+        tier = list(tier)
+        futures = [
+            submit("triggers", trigger.run, context)
+            for trigger in tier
+            if not trigger.ordered
+        ]
+        try:
+            for trigger in tier:
+                if trigger.ordered:
+                    trigger.run(context)
+        finally:
+            wait(futures)
+        gather(futures)
 
     return activated_triggers
 
 
+def _priority(trigger):
+    return trigger._dispatch_key[0]
+
+
 @with_app_context
 def process_interactive(data):
     payload = InteractivePayload(data)
 
     for action in payload.actions:
-        for trigger_cls in trigger_registry:
-            if issubclass(trigger_cls, InteractiveCommand):
-                trigger = trigger_cls()
-                if trigger.is_action_relevant(action):
-                    trigger.interact(payload, action)
+        trigger_cls = get_action_handler(action.command)
+        if trigger_cls is None:
+            meowbot.log.warning(f"No handler for action {action.command!r}")
+            continue
+        trigger = trigger_cls()
+        if not trigger.is_action_relevant(payload, action):
+            meowbot.log.warning(f"Action {action.command!r} not allowed here")
+            continue
+        trigger.interact(payload, action)
 
     return
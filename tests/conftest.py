@@ -0,0 +1,4 @@
+import os
+
+# instance/config.py requires it
+os.environ.setdefault("MEOWBOT_HOST", "localhost")
@@ -0,0 +1,69 @@
+import pytest
+import requests
+from urllib3.exceptions import MaxRetryError
+from urllib3.exceptions import NewConnectionError
+from urllib3.exceptions import ProtocolError
+
+from meowbot import api
+from meowbot.api import SlackApi
+
+ARGUMENTS = {"channel": "C1", "text": "meow"}
+
+
+@pytest.fixture
+def sends(monkeypatch):
+    """Replaces the network with a queue of outcomes, raising any exceptions"""
+    outcomes = []
+    sent = []
+
+    def send(name, http_method, url, **kwargs):
+        sent.append(name)
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    monkeypatch.setattr(api, "_send", send)
+    monkeypatch.setattr(api, "reserve", lambda key, tier: None)
+    monkeypatch.setattr(api.time, "sleep", lambda seconds: None)
+    return outcomes, sent
+
+
+def ok_response():
+    response = requests.Response()
+    response.status_code = 200
+    response._content = b'{"ok": true}'
+    return response
+
+
+def refused():
+    reason = NewConnectionError(None, "Connection refused")
+    return requests.ConnectionError(MaxRetryError(None, "/", reason))
+
+
+@pytest.mark.parametrize(
+    "error", [refused(), requests.ConnectTimeout("timed out")], ids=repr
+)
+def test_connection_failures_are_retried(sends, error):
+    outcomes, sent = sends
+    outcomes.extend([error, ok_response()])
+    assert SlackApi("xoxb", "T1").chat_post_message(ARGUMENTS).ok
+    assert len(sent) == 2
+
+
+def test_connection_failures_give_up(sends):
+    outcomes, sent = sends
+    outcomes.extend(refused() for _ in range(api.SLACK_MAX_ATTEMPTS))
+    with pytest.raises(requests.ConnectionError):
+        SlackApi("xoxb", "T1").chat_post_message(ARGUMENTS)
+    assert len(sent) == api.SLACK_MAX_ATTEMPTS
+
+
+def test_dropped_connections_are_not_retried(sends):
+    # Slack may already have posted the message
+    outcomes, sent = sends
+    error = ProtocolError("Connection aborted.", ConnectionResetError(104))
+    outcomes.extend([requests.ConnectionError(error), ok_response()])
+    with pytest.raises(requests.ConnectionError):
+        SlackApi("xoxb", "T1").chat_post_message(ARGUMENTS)
+    assert len(sent) == 1
@@ -0,0 +1,67 @@
+import re
+
+import pytest
+
+from meowbot.conditions import _required_literal
+from meowbot.conditions import TextMatcher
+
+
+@pytest.mark.parametrize(
+    ("pattern", "flags", "expected"),
+    [
+        (r"hello", 0, "hello"),
+        (r"\bmeow+\b", 0, "meo"),
+        (r"foo\s+barbaz", 0, "barbaz"),
+        (r"a\.b", 0, "a.b"),
+        (r"cats?|dogs", 0, None),
+        (r"(?:ab|cd)efg", 0, "efg"),
+        (r"[abc]xyz", 0, "xyz"),
+        (r"\x41bc", 0, None),
+        (r"\u0041bc", 0, None),
+        (r"\N{LATIN CAPITAL LETTER A}bc", 0, None),
+        (r"\101bc", 0, None),
+        (r"(a)xyz\1", 0, None),
+        (r"hello", re.VERBOSE, None),
+    ],
+)
+def test_required_literal(pattern, flags, expected):
+    assert _required_literal(re.compile(pattern, flags)) == expected
+
+
+@pytest.mark.parametrize(
+    ("pattern", "text"),
+    [
+        (r"\x41bc", "xxAbcxx"),
+        (r"\u0041bc", "xxAbcxx"),
+        (r"\N{LATIN CAPITAL LETTER A}bc", "xxAbcxx"),
+        (r"\101bc", "xxAbcxx"),
+    ],
+)
+def test_scan_matches_escapes(pattern, text):
+    matcher = TextMatcher()
+    index = matcher.register(re.compile(pattern))
+    assert re.search(pattern, text)
+    assert matcher.scan(text) == {index}
+
+
+def test_scan_duplicate_group_names():
+    matcher = TextMatcher()
+    first = matcher.register(re.compile(r"(?P<word>cat)s"))
+    second = matcher.register(re.compile(r"(?P<word>dog)s"))
+    third = matcher.register(re.compile(r"birds"))
+    assert matcher.scan("cats and dogs") == {first, second}
+    assert matcher.scan("birds") == {third}
+
+
+def test_scan_overlapping_matches():
+    matcher = TextMatcher()
+    cat = matcher.register(re.compile(r"cat"))
+    catalog = matcher.register(re.compile(r"catalog"))
+    assert matcher.scan("the catalog") == {cat, catalog}
+    assert matcher.scan("nothing here") == frozenset()
+
+
+def test_scan_ignore_case():
+    matcher = TextMatcher()
+    index = matcher.register(re.compile(r"meow", re.IGNORECASE))
+    assert matcher.scan("MEOW") == {index}
@@ -0,0 +1,94 @@
+import pytest
+import redis
+
+import meowbot.util
+from meowbot import ratelimit
+from meowbot.ratelimit import RateLimitError
+from meowbot.ratelimit import RateTier
+
+fakeredis = pytest.importorskip("fakeredis")
+pytest.importorskip("lupa")
+
+KEY = "slack:ratelimit:T1:chat.postmessage:C1"
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    server = fakeredis.FakeStrictRedis()
+    monkeypatch.setattr(meowbot.util, "get_redis", lambda: server)
+    meowbot.util.get_script.cache_clear()
+    yield server
+    meowbot.util.get_script.cache_clear()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(ratelimit.time, "sleep", sleeps.append)
+    monkeypatch.setattr(ratelimit.random, "uniform", lambda a, b: 0)
+    return sleeps
+
+
+def test_burst_is_not_delayed(sleeps):
+    for _ in range(RateTier.PER_CHANNEL.burst):
+        ratelimit.reserve(KEY, RateTier.PER_CHANNEL)
+    assert sleeps == []
+
+
+def test_requests_past_the_burst_are_spaced(sleeps):
+    tier = RateTier.PER_CHANNEL
+    for _ in range(tier.burst + 2):
+        ratelimit.reserve(KEY, tier)
+    assert len(sleeps) == 2
+    assert sleeps[0] == pytest.approx(tier.interval, abs=0.1)
+    assert sleeps[1] == pytest.approx(2 * tier.interval, abs=0.1)
+
+
+def test_buckets_are_independent(sleeps):
+    tier = RateTier.TIER_1
+    ratelimit.reserve(KEY, tier)
+    ratelimit.reserve(KEY + ":other", tier)
+    assert sleeps == []
+
+
+def test_queueing_too_long_raises(sleeps, monkeypatch):
+    monkeypatch.setattr(ratelimit, "SLACK_MAX_QUEUE_SECONDS", 30)
+    tier = RateTier.TIER_1
+    ratelimit.reserve(KEY, tier)
+    with pytest.raises(RateLimitError):
+        ratelimit.reserve(KEY, tier)
+    # A refused caller doesn't take a slot
+    with pytest.raises(RateLimitError):
+        ratelimit.reserve(KEY, tier)
+    assert sleeps == []
+
+
+def test_block_holds_every_caller(sleeps):
+    ratelimit.block(KEY, 5)
+    ratelimit.reserve(KEY, RateTier.TIER_4)
+    assert sleeps == [pytest.approx(5, abs=0.1)]
+
+
+def test_block_never_shortens(sleeps):
+    ratelimit.block(KEY, 5)
+    ratelimit.block(KEY, 1)
+    ratelimit.reserve(KEY, RateTier.TIER_4)
+    assert sleeps == [pytest.approx(5, abs=0.1)]
+
+
+def test_keys_expire(fake_redis, sleeps):
+    ratelimit.reserve(KEY, RateTier.TIER_4)
+    assert 0 < fake_redis.ttl(KEY) <= 61
+
+
+def test_fails_open_without_redis(monkeypatch, sleeps):
+    def unavailable(source):
+        def script(**kwargs):
+            raise redis.ConnectionError
+
+        return script
+
+    monkeypatch.setattr(ratelimit, "get_script", unavailable)
+    ratelimit.reserve(KEY, RateTier.TIER_1)
+    ratelimit.block(KEY, 5)
+    assert sleeps == []
@@ -0,0 +1,142 @@
+import json
+from datetime import datetime
+from datetime import UTC
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from meowbot.streaming import iter_ical_events
+from meowbot.streaming import iter_json_array
+
+DOCUMENT = {
+    "version": "0.1",
+    "count": 7,
+    "ratio": 3.14159,
+    "exponent": -1.5e-3,
+    "flag": True,
+    "nested": {"a": [1, 2, {"b": "]}"}]},
+    "results": [
+        {"ID": i, "Label": f"é→{i}", "Stats": json.dumps({"v1": i * 1.5})}
+        for i in range(200)
+    ],
+    "after": 12345678901234,
+}
+
+
+def chunked(data: bytes, size: int):
+    return [data[i : i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+@pytest.mark.parametrize("size", [1, 3, 7, 64, 1 << 20])
+def test_iter_json_array(indent, size):
+    data = json.dumps(DOCUMENT, ensure_ascii=False, indent=indent).encode()
+    results = iter_json_array(chunked(data, size), "results")
+    assert list(results) == DOCUMENT["results"]
+
+
+def test_iter_json_array_numbers_split_across_chunks():
+    data = b'{"before": 1234567, "results": [1234567, 2.5e10]}'
+    assert list(iter_json_array(chunked(data, 1), "results")) == [1234567, 2.5e10]
+
+
+@pytest.mark.parametrize("data", [b'{"results": []}', b'{"results" : [ ] }'])
+def test_iter_json_array_empty(data):
+    assert list(iter_json_array([data], "results")) == []
+
+
+@pytest.mark.parametrize("data", [b'{"other": 1}', b"{}"])
+def test_iter_json_array_missing_key(data):
+    with pytest.raises(KeyError):
+        list(iter_json_array([data], "results"))
+
+
+@pytest.mark.parametrize(
+    "data",
+    [b'{"results": [1, 2', b'[{"results": []}]', b'{"results": [1 2]}', b""],
+)
+def test_iter_json_array_malformed(data):
+    with pytest.raises(ValueError):
+        list(iter_json_array(chunked(data, 2), "results"))
+
+
+def test_iter_json_array_stops_buffering_malformed_values():
+    read = []
+
+    def chunks():
+        yield b'{"results": [{"ok": 1}, {"broken": '
+        while True:
+            read.append(1)
+            yield b"x" * 1024
+
+    results = iter_json_array(chunks(), "results", max_value_size=16 * 1024)
+    assert next(results) == {"ok": 1}
+    with pytest.raises(ValueError):
+        next(results)
+    assert len(read) <= 17
+
+
+CALENDAR = b"""BEGIN:VCALENDAR\r
+VERSION:2.0\r
+BEGIN:VTIMEZONE\r
+TZID:America/Los_Angeles\r
+BEGIN:DAYLIGHT\r
+DTSTART:20190310T100000\r
+END:DAYLIGHT\r
+END:VTIMEZONE\r
+BEGIN:VEVENT\r
+DTSTART;TZID="America/Los_Angeles":20300601T123000\r
+DTEND;TZID=America/Los_Angeles:20300601T140000\r
+SUMMARY:Jazz \\, Blues \\; more\r
+DESCRIPTION:Line one\\nLine two is long enough that it gets fo\r
+ lded \\\\ here\r
+URL:https://ybgfestival.org/event/jazz/\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART:20300602T190000Z\r
+SUMMARY:Caf\xc3\xa9\r
+END:VEVENT\r
+BEGIN:VEVENT\r
+DTSTART;VALUE=DATE:20300603\r
+DTEND;VALUE=DATE:20300604\r
+SUMMARY:All day\r
+END:VEVENT\r
+END:VCALENDAR\r
+"""
+
+
+def test_iter_ical_events():
+    pacific = ZoneInfo("America/Los_Angeles")
+    assert list(iter_ical_events(CALENDAR.splitlines())) == [
+        {
+            "name": "Jazz , Blues ; more",
+            "url": "https://ybgfestival.org/event/jazz/",
+            "description": (
+                "Line one\nLine two is long enough that it gets folded \\ here"
+            ),
+            "begin": datetime(2030, 6, 1, 12, 30, tzinfo=pacific),
+            "end": datetime(2030, 6, 1, 14, 0, tzinfo=pacific),
+        },
+        {
+            "name": "Café",
+            "url": None,
+            "description": None,
+            "begin": datetime(2030, 6, 2, 19, 0, tzinfo=UTC),
+            "end": datetime(2030, 6, 2, 19, 0, tzinfo=UTC),
+        },
+        {
+            "name": "All day",
+            "url": None,
+            "description": None,
+            "begin": datetime(2030, 6, 3, tzinfo=UTC),
+            "end": datetime(2030, 6, 4, tzinfo=UTC),
+        },
+    ]
+
+
+def test_iter_ical_events_split_line_endings():
+    # iter_lines can split a CRLF across chunks, leaving blank lines
+    lines = CALENDAR.replace(b"\r\n", b"\r\n\n").split(b"\n")
+    assert list(iter_ical_events(lines)) == list(
+        iter_ical_events(CALENDAR.splitlines())
+    )
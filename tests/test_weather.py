@@ -0,0 +1,48 @@
+import pytest
+
+from meowbot.plugins.weather import convert_summary
+from meowbot.plugins.weather import convert_temperature
+from meowbot.plugins.weather import forecast_cell
+
+
+@pytest.mark.parametrize(
+    ("fahrenheit", "units", "expected"),
+    [
+        (32, "si", 0),
+        (212, "si", 100),
+        (-40, "si", -40),
+        (68, "us", 68),
+    ],
+)
+def test_convert_temperature(fahrenheit, units, expected):
+    assert convert_temperature(fahrenheit, units) == pytest.approx(expected)
+
+
+def test_converted_temperatures_round():
+    # 31°F is -0.56°C
+    assert round(convert_temperature(31, "si")) == -1
+
+
+@pytest.mark.parametrize(
+    ("summary", "units", "expected"),
+    [
+        (
+            "Mostly cloudy throughout the day.",
+            "si",
+            "Mostly cloudy throughout the day.",
+        ),
+        ("High of 75°F.", "si", "High of 24°C."),
+        ("Lows near -4°F.", "si", "Lows near -20°C."),
+        ("Snow (1–2 in.) overnight.", "si", "Snow (3–5 cm.) overnight."),
+        ("Rain (< 1 in.) tonight.", "si", "Rain (< 3 cm.) tonight."),
+        ("Snow (1–2 in.) and 75°F.", "us", "Snow (1–2 in.) and 75°F."),
+    ],
+)
+def test_convert_summary(summary, units, expected):
+    assert convert_summary(summary, units) == expected
+
+
+def test_forecast_cell_shares_nearby_locations():
+    sf = {"lat": "37.77493", "lon": "-122.41942"}
+    san_francisco = {"lat": "37.7749295", "lon": "-122.4194155"}
+    assert forecast_cell(sf) == forecast_cell(san_francisco) == "37.77,-122.42"